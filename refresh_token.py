@@ -2,30 +2,50 @@
 """Manual script to refresh Meta access token for WhatsApp Business API."""
 
 import asyncio
+
 import httpx
-from src.lanabot.config import get_settings
+from src.lanabot.config import Settings, get_settings
+from src.lanabot.retry import (
+    RETRYABLE_STATUS_CODES,
+    is_retryable_http_error,
+    retry_with_backoff,
+)
+
+try:
+    import uvloop  # Installed with uvicorn[standard]
+except ImportError:
+    uvloop = None
+
+
+async def get_with_retry(
+    client: httpx.AsyncClient, url: str, **kwargs
+) -> httpx.Response:
+    """GET, retrying rate limits and transient failures like the bot does."""
 
+    async def get() -> httpx.Response:
+        response = await client.get(url, **kwargs)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            response.raise_for_status()
+        return response
 
-async def refresh_meta_token():
+    return await retry_with_backoff(get, should_retry=is_retryable_http_error)
+
+
+async def refresh_meta_token(settings: Settings, client: httpx.AsyncClient):
     """Refresh Meta access token and display the new token."""
-    settings = get_settings()
-    
     print("🔄 Refreshing Meta access token...")
     print(f"App ID: {settings.meta_app_id}")
     print(f"Current token (first 20 chars): {settings.meta_access_token[:20]}...")
     
     try:
         # Method 1: Try app access token generation
-        url = "https://graph.facebook.com/oauth/access_token"
-        
         params = {
             "grant_type": "client_credentials",
             "client_id": settings.meta_app_id,
             "client_secret": settings.meta_app_secret
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
+        response = await get_with_retry(client, "/oauth/access_token", params=params)
         
         print(f"\n📡 Response Status: {response.status_code}")
         
@@ -50,10 +70,10 @@ async def refresh_meta_token():
             
             # Method 2: Try to get info about current token
             print(f"\n🔍 Checking current token info...")
-            token_info_url = f"https://graph.facebook.com/me?access_token={settings.meta_access_token}"
-            
-            async with httpx.AsyncClient() as client:
-                info_response = await client.get(token_info_url)
+            info_response = await get_with_retry(
+                client,
+                "/me", params={"access_token": settings.meta_access_token}
+            )
             
             print(f"Token info response: {info_response.status_code}")
             if info_response.status_code == 200:
@@ -68,22 +88,19 @@ async def refresh_meta_token():
         return None
 
 
-async def test_token(token: str):
+async def test_token(settings: Settings, client: httpx.AsyncClient, token: str):
     """Test if a token works for WhatsApp API."""
-    settings = get_settings()
-    
     print(f"\n🧪 Testing token...")
     
     # Try to get phone number info
-    url = f"https://graph.facebook.com/v18.0/{settings.meta_phone_number_id}"
+    url = f"/v18.0/{settings.meta_phone_number_id}"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
+        response = await get_with_retry(client, url, headers=headers)
         
         print(f"Test response: {response.status_code}")
         
@@ -102,33 +119,41 @@ async def test_token(token: str):
 
 if __name__ == "__main__":
     async def main():
-        new_token = await refresh_meta_token()
+        settings = get_settings()
+
+        # One client for the whole run so refresh and verify share a connection
+        async with httpx.AsyncClient(
+            base_url="https://graph.facebook.com",
+            http2=True,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+        ) as client:
+            new_token = await refresh_meta_token(settings, client)
         
-        if new_token:
-            # Test the new token
-            works = await test_token(new_token)
+            if new_token:
+                # Test the new token
+                works = await test_token(settings, client, new_token)
             
-            if works:
-                print(f"\n🎉 Success! Your new token is working.")
-                print(f"📝 Don't forget to update your .env file!")
+                if works:
+                    print(f"\n🎉 Success! Your new token is working.")
+                    print(f"📝 Don't forget to update your .env file!")
+                else:
+                    print(f"\n⚠️  Generated token but it doesn't seem to work for WhatsApp API")
             else:
-                print(f"\n⚠️  Generated token but it doesn't seem to work for WhatsApp API")
-        else:
-            print(f"\n💡 REQUIRED: Get user access token from Meta Developers Console:")
-            print(f"   1. Visit: https://developers.facebook.com/apps/{get_settings().meta_app_id}/whatsapp-business/wa-dev-console/")
-            print(f"   2. Look for 'Temporary access token' section")
-            print(f"   3. Click 'Generate Token' (this creates a USER access token)")
-            print(f"   4. Copy the token (starts with EAAA...)")
-            print(f"   5. Update META_ACCESS_TOKEN in your .env file") 
-            print(f"   6. Restart your application")
-            print(f"\n🔍 Current token format: {'User token' if get_settings().meta_access_token.startswith('EAAA') else 'App token (needs replacement)'}")
+                print(f"\n💡 REQUIRED: Get user access token from Meta Developers Console:")
+                print(f"   1. Visit: https://developers.facebook.com/apps/{settings.meta_app_id}/whatsapp-business/wa-dev-console/")
+                print(f"   2. Look for 'Temporary access token' section")
+                print(f"   3. Click 'Generate Token' (this creates a USER access token)")
+                print(f"   4. Copy the token (starts with EAAA...)")
+                print(f"   5. Update META_ACCESS_TOKEN in your .env file") 
+                print(f"   6. Restart your application")
+                print(f"\n🔍 Current token format: {'User token' if settings.meta_access_token.startswith('EAAA') else 'App token (needs replacement)'}")
             
-            # Check current token type
-            current_token = get_settings().meta_access_token
-            if '|' in current_token:
-                print(f"⚠️  You're using an APP access token: {current_token[:20]}...")
-                print(f"   WhatsApp Business API requires USER access tokens (start with EAAA)")
-            else:
-                print(f"✅ Token format looks correct: {current_token[:20]}...")
+                # Check current token type
+                current_token = settings.meta_access_token
+                if '|' in current_token:
+                    print(f"⚠️  You're using an APP access token: {current_token[:20]}...")
+                    print(f"   WhatsApp Business API requires USER access tokens (start with EAAA)")
+                else:
+                    print(f"✅ Token format looks correct: {current_token[:20]}...")
     
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
\ No newline at end of file
@@ -2,7 +2,6 @@
 """Add demo transactions directly to database for better search functionality demonstration."""
 
 import asyncio
-from datetime import datetime
 
 from src.lanabot.database import DatabaseManager
 
@@ -41,20 +40,18 @@ async def add_demo_transactions():
     
     print(f"Adding {len(demo_data)} demo transactions for {demo_phone}...")
     
-    for data in demo_data:
-        try:
-            # Insert directly using Supabase client
-            data["created_at"] = datetime.utcnow().isoformat()
-            result = db.client.table("transactions").insert(data).execute()
-            
-            if result.data:
-                transaction = result.data[0]
+    try:
+        # Insert all rows in a single request; created_at defaults to NOW()
+        result = db.client.table("transactions").insert(demo_data).execute()
+
+        if result.data:
+            for transaction in result.data:
                 print(f"✅ Added: {transaction['transaction_type']} ${transaction['amount']} - {transaction['description']}")
-            else:
-                print(f"❌ Failed to add: {data}")
-                
-        except Exception as e:
-            print(f"❌ Error adding transaction: {e}")
+        else:
+            print(f"❌ Failed to add: {demo_data}")
+
+    except Exception as e:
+        print(f"❌ Error adding transactions: {e}")
     
     print("\n📊 Demo data added successfully!")
     print(f"🔍 Now you can test searches like:")
@@ -12,11 +12,31 @@ CREATE TABLE IF NOT EXISTS transactions (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- WhatsApp message that created the row; lets inserts be retried safely.
+-- Required migration for existing databases: until it runs, the bot falls
+-- back to plain inserts and Meta redeliveries can record duplicates
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS message_id TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_phone_message
+    ON transactions(phone_number, message_id);
+
 -- Create indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_transactions_phone_number ON transactions(phone_number);
 CREATE INDEX IF NOT EXISTS idx_transactions_created_at ON transactions(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(transaction_type);
 
+-- Per-user lookups filter by phone_number and order by created_at; the
+-- composite index serves both (and replaces the phone_number-only index)
+CREATE INDEX IF NOT EXISTS idx_transactions_phone_created
+    ON transactions(phone_number, created_at DESC);
+DROP INDEX IF EXISTS idx_transactions_phone_number;
+-- Check it is used (expect an Index Scan, no Sort node):
+-- EXPLAIN ANALYZE SELECT * FROM transactions
+--     WHERE phone_number = '+5215551234567' ORDER BY created_at DESC LIMIT 10;
+
+-- Trigram index so description ILIKE '%term%' searches avoid sequential scans
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_transactions_description_trgm
+    ON transactions USING gin (description gin_trgm_ops);
+
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -33,6 +53,105 @@ CREATE TRIGGER update_transactions_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Aggregate balance totals server-side, one row per phone (called via rpc)
+-- Cash adjustments are detected by description keywords, same as the bot
+CREATE OR REPLACE FUNCTION get_balances(phones TEXT[])
+RETURNS TABLE (
+    phone_number VARCHAR(20),
+    total_sales NUMERIC,
+    total_expenses NUMERIC,
+    total_adjustments NUMERIC,
+    last_updated TIMESTAMP WITH TIME ZONE
+) AS $$
+    SELECT
+        t.phone_number,
+        COALESCE(SUM(t.amount) FILTER (
+            WHERE t.transaction_type = 'venta'
+            AND NOT t.description ILIKE ANY (ARRAY['%saldo inicial%', '%agregado%', '%ajuste positivo%'])
+        ), 0) AS total_sales,
+        COALESCE(SUM(t.amount) FILTER (
+            WHERE t.transaction_type = 'gasto'
+            AND NOT t.description ILIKE ANY (ARRAY['%retirado%', '%ajuste negativo%'])
+        ), 0) AS total_expenses,
+        COALESCE(SUM(
+            CASE
+                WHEN t.transaction_type = 'venta'
+                    AND t.description ILIKE ANY (ARRAY['%saldo inicial%', '%agregado%', '%ajuste positivo%'])
+                    THEN t.amount
+                WHEN t.transaction_type = 'gasto'
+                    AND t.description ILIKE ANY (ARRAY['%retirado%', '%ajuste negativo%'])
+                    THEN -t.amount
+                ELSE 0
+            END
+        ), 0) AS total_adjustments,
+        MAX(t.created_at) AS last_updated
+    FROM transactions t
+    WHERE t.phone_number = ANY (phones)
+    GROUP BY t.phone_number;
+$$ LANGUAGE sql STABLE;
+
+-- Single-phone variant of get_balances (no row when the phone has no data)
+CREATE OR REPLACE FUNCTION get_balance_summary(phone TEXT)
+RETURNS TABLE (
+    total_sales NUMERIC,
+    total_expenses NUMERIC,
+    total_adjustments NUMERIC,
+    last_updated TIMESTAMP WITH TIME ZONE
+) AS $$
+    SELECT total_sales, total_expenses, total_adjustments, last_updated
+    FROM get_balances(ARRAY[phone]);
+$$ LANGUAGE sql STABLE;
+
+-- Change a transaction's type and return its owner's updated balance (called
+-- via rpc). The function is VOLATILE, so the SELECT sees the UPDATE
+CREATE OR REPLACE FUNCTION correct_transaction_and_return_balance(txn_id INTEGER, new_type TEXT)
+RETURNS TABLE (
+    phone_number VARCHAR(20),
+    total_sales NUMERIC,
+    total_expenses NUMERIC,
+    total_adjustments NUMERIC,
+    last_updated TIMESTAMP WITH TIME ZONE
+) AS $$
+    UPDATE transactions SET transaction_type = new_type WHERE id = txn_id;
+
+    SELECT b.*
+    FROM transactions t, get_balances(ARRAY[t.phone_number::TEXT]) b
+    WHERE t.id = txn_id;
+$$ LANGUAGE sql VOLATILE;
+
+-- Real expense total and distinct expense days since a cutoff (called via rpc)
+CREATE OR REPLACE FUNCTION daily_expense_stats(phone TEXT, since TIMESTAMP WITH TIME ZONE)
+RETURNS TABLE (
+    total NUMERIC,
+    days BIGINT
+) AS $$
+    SELECT
+        COALESCE(SUM(amount), 0) AS total,
+        COUNT(DISTINCT date_trunc('day', created_at)) AS days
+    FROM transactions
+    WHERE phone_number = phone
+      AND created_at >= since
+      AND transaction_type = 'gasto'
+      AND description !~* '(retirado|ajuste negativo)';
+$$ LANGUAGE sql STABLE;
+
+-- Balance totals and expense stats for one phone in a single call (called
+-- via rpc); always returns one row, with zero totals when there is no data
+CREATE OR REPLACE FUNCTION get_account_snapshot(phone TEXT, since TIMESTAMP WITH TIME ZONE)
+RETURNS TABLE (
+    total_sales NUMERIC,
+    total_expenses NUMERIC,
+    total_adjustments NUMERIC,
+    last_updated TIMESTAMP WITH TIME ZONE,
+    expense_total NUMERIC,
+    expense_days BIGINT
+) AS $$
+    SELECT b.total_sales, b.total_expenses, b.total_adjustments, b.last_updated,
+           s.total, s.days
+    FROM daily_expense_stats(phone, since) s
+    LEFT JOIN get_balance_summary(phone) b ON TRUE;
+$$ LANGUAGE sql STABLE;
+
 -- Enable Row Level Security (RLS) - optional but recommended
 ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
 
@@ -0,0 +1,63 @@
+"""In-process TTL cache for LanaBot."""
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache[K, V]:
+    """Bounded LRU mapping whose entries expire after a fixed number of seconds.
+
+    Kept to get/set/pop so a shared backend (e.g. Redis) can replace it for
+    multi-instance deployments without touching callers.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024) -> None:
+        """Initialize the cache."""
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        """Return the cached value, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        """Remove and return a value, or None if missing or expired."""
+        value = self.get(key)
+        self._data.pop(key, None)
+        return value
+
+    def expire(self) -> int:
+        """Drop every expired entry and return how many were removed."""
+        now = time.monotonic()
+        expired = [
+            key for key, (expires_at, _) in self._data.items() if now >= expires_at
+        ]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    def __contains__(self, key: K) -> bool:
+        """Check if a live entry exists for key."""
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        """Return the number of stored entries, including not-yet-evicted ones."""
+        return len(self._data)
@@ -14,6 +14,7 @@ class Settings(BaseSettings):
         env_file=".env",
         env_file_encoding="utf-8",
         case_sensitive=False,
+        frozen=True,
     )
 
     # OpenAI Configuration
@@ -36,6 +37,10 @@ class Settings(BaseSettings):
     port: int = Field(default=8000, description="Application port")
     host: str = Field(default="0.0.0.0", description="Application host")
     debug: bool = Field(default=False, description="Debug mode")
+    workers: int = Field(
+        default=1,
+        description="Uvicorn worker processes (pending/caches are per process)",
+    )
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = Field(
         default="INFO", description="Log level"
     )
@@ -45,6 +50,9 @@ class Settings(BaseSettings):
         default=500.0, description="Minimum balance to trigger alert"
     )
     default_currency: str = Field(default="MXN", description="Default currency")
+    openai_max_concurrency: int = Field(
+        default=8, description="Maximum concurrent OpenAI requests per process"
+    )
 
     # Railway/Production Configuration
     railway_environment: str = Field(
@@ -52,7 +60,7 @@ class Settings(BaseSettings):
     )
 
 
-@lru_cache
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """Get cached application settings."""
     return Settings()
@@ -1,33 +1,157 @@
 """Database operations for LanaBot."""
 
+import asyncio
 import logging
-from datetime import UTC, datetime
+import re
+from datetime import UTC, datetime, timedelta
 from decimal import Decimal
+from functools import lru_cache
 
-from supabase import Client, create_client
+import httpx
+from postgrest.exceptions import APIError
+from supabase import Client, ClientOptions, create_client
 
+from .cache import TTLCache
 from .config import get_settings
-from .models import Balance, Transaction, TransactionType
+from .models import AccountSnapshot, Balance, Transaction, TransactionType
+from .retry import RETRYABLE_STATUS_CODES, retry_with_backoff
 
 
 logger = logging.getLogger(__name__)
 
+# Description keywords that mark cash adjustments rather than sales/expenses
+_POSITIVE_ADJUSTMENT_RE = re.compile(r"saldo inicial|agregado|ajuste positivo", re.I)
+_NEGATIVE_ADJUSTMENT_RE = re.compile(r"retirado|ajuste negativo", re.I)
+
+# Seconds a computed balance is reused before querying again
+_BALANCE_CACHE_TTL = 5.0
+
+# Connection failures happen before the request is sent, so retrying an
+# insert on them cannot store the same transaction twice
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# PostgREST reports gateway/rate-limit failures with the HTTP status as code
+_RETRYABLE_API_CODES = frozenset(str(code) for code in RETRYABLE_STATUS_CODES)
+
+# PostgREST errors for a database without the message_id column/unique index:
+# unknown column in the schema cache, undefined column, no ON CONFLICT target
+_MISSING_MESSAGE_ID_CODES = frozenset({"PGRST204", "42703", "42P10"})
+
+# Full transaction row, with amount cast to text so it parses straight to
+# Decimal instead of going through a JSON float
+_TRANSACTION_COLUMNS = (
+    "id,phone_number,transaction_type,amount::text,"
+    "description,created_at,updated_at"
+)
+
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """Get the process-wide Supabase client."""
+    settings = get_settings()
+    # One keep-alive pool shared by every query thread, instead of the
+    # library defaults reopening connections under load
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+        http2=True,
+        timeout=10.0,
+    )
+    return create_client(
+        settings.supabase_url,
+        settings.supabase_key,
+        options=ClientOptions(httpx_client=http_client),
+    )
+
+
+def _is_connect_error(error: Exception) -> bool:
+    """Check if a query failed before reaching the server."""
+    return isinstance(error, _CONNECT_ERRORS)
+
+
+def _is_transient_error(error: Exception) -> bool:
+    """Check if a failed query may succeed when sent again."""
+    if isinstance(error, APIError):
+        return str(error.code) in _RETRYABLE_API_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def _row_to_transaction(data: dict) -> Transaction:
+    """Build a Transaction from a database row without re-validating it."""
+    # Rows are already constrained by the table schema, so skip pydantic
+    # validation; transaction_type stays a plain string as use_enum_values would
+    return Transaction.model_construct(
+        id=data["id"],
+        phone_number=data["phone_number"],
+        transaction_type=data["transaction_type"],
+        amount=Decimal(data["amount"]),
+        description=data["description"],
+        created_at=datetime.fromisoformat(data["created_at"]),
+        updated_at=datetime.fromisoformat(data["updated_at"])
+        if data.get("updated_at")
+        else None,
+    )
+
+
+def _daily_average(total_expenses: Decimal, expense_days: int) -> Decimal:
+    """Average expense per day, assuming $100 daily when there is no data."""
+    if expense_days and total_expenses > 0:
+        return total_expenses / expense_days
+    return Decimal("100")
+
+
+def _balance_from_summary(phone_number: str, summary: dict) -> Balance:
+    """Build a Balance from a get_balances / get_balance_summary row."""
+    total_sales = Decimal(str(summary.get("total_sales") or 0))
+    total_expenses = Decimal(str(summary.get("total_expenses") or 0))
+    total_adjustments = Decimal(str(summary.get("total_adjustments") or 0))
+    last_updated = (
+        datetime.fromisoformat(summary["last_updated"])
+        if summary.get("last_updated")
+        else datetime.now(UTC)
+    )
+
+    return Balance(
+        phone_number=phone_number,
+        current_balance=total_sales - total_expenses + total_adjustments,
+        total_sales=total_sales,
+        total_expenses=total_expenses,
+        total_adjustments=total_adjustments,
+        last_updated=last_updated,
+    )
+
 
 class DatabaseManager:
     """Database manager for Supabase operations."""
 
     def __init__(self) -> None:
         """Initialize database manager."""
-        settings = get_settings()
-        self.client: Client = create_client(
-            settings.supabase_url, settings.supabase_key
+        self.client: Client = get_supabase_client()
+        self._minimum_balance_alert = Decimal(
+            str(get_settings().minimum_balance_alert)
+        )
+        self._balance_cache: TTLCache[str, Balance] = TTLCache(
+            ttl=_BALANCE_CACHE_TTL, maxsize=10_000
         )
+        self._snapshot_cache: TTLCache[str, AccountSnapshot] = TTLCache(
+            ttl=_BALANCE_CACHE_TTL, maxsize=10_000
+        )
+
+    def _forget_balance(self, phone_number: str) -> None:
+        """Drop cached balance data after a write for this phone number."""
+        self._balance_cache.pop(phone_number)
+        self._snapshot_cache.pop(phone_number)
 
-    async def create_transaction(self, transaction: Transaction) -> Transaction:
-        """Create a new transaction in the database."""
+    async def _execute(self, query):
+        """Run a blocking PostgREST query in a worker thread."""
+        return await asyncio.to_thread(query.execute)
+
+    async def create_transaction(self, transaction: Transaction) -> Transaction | None:
+        """Create a new transaction in the database.
+
+        Returns None when the WhatsApp message was already recorded earlier.
+        """
         try:
-            logger.info(f"Creating transaction: {transaction}")
-            logger.info(f"Transaction type: {transaction.transaction_type}, type: {type(transaction.transaction_type)}")
+            logger.debug("Creating transaction: %s", transaction)
 
             # Handle both enum and string transaction types
             if hasattr(transaction.transaction_type, "value"):
@@ -40,49 +164,95 @@ class DatabaseManager:
                 "transaction_type": transaction_type_value,
                 "amount": float(transaction.amount),
                 "description": transaction.description,
-                "created_at": datetime.utcnow().isoformat(),
             }
 
-            result = self.client.table("transactions").insert(data).execute()
-
-            if result.data:
-                created_transaction = result.data[0]
-                return Transaction(
-                    id=created_transaction["id"],
-                    phone_number=created_transaction["phone_number"],
-                    transaction_type=TransactionType(
-                        created_transaction["transaction_type"]
-                    ),
-                    amount=Decimal(str(created_transaction["amount"])),
-                    description=created_transaction["description"],
-                    created_at=datetime.fromisoformat(
-                        created_transaction["created_at"]
-                    ),
-                    updated_at=datetime.fromisoformat(
-                        created_transaction["updated_at"]
+            if transaction.message_id:
+                try:
+                    return await self._insert_once(transaction, data)
+                except APIError as e:
+                    if str(e.code) not in _MISSING_MESSAGE_ID_CODES:
+                        raise
+                    logger.warning(
+                        f"message_id migration not applied, inserting without it: {e}"
                     )
-                    if created_transaction.get("updated_at")
-                    else None,
-                )
 
-            msg = "No data returned from transaction creation"
-            raise ValueError(msg)
+            result = await retry_with_backoff(
+                lambda: self._execute(self.client.table("transactions").insert(data)),
+                should_retry=_is_connect_error,
+            )
+            return self._saved_transaction(transaction, result.data)
 
         except Exception as e:
             logger.error(f"Error creating transaction: {e}")
             raise
 
+    async def _insert_once(
+        self, transaction: Transaction, data: dict
+    ) -> Transaction | None:
+        """Insert a transaction keyed by its WhatsApp message, at most once."""
+        # Existing rows are left untouched, so a Meta redelivery can't undo a
+        # type the user already corrected
+        query = self.client.table("transactions").upsert(
+            {**data, "message_id": transaction.message_id},
+            on_conflict="phone_number,message_id",
+            ignore_duplicates=True,
+        )
+        attempts = 0
+
+        async def insert():
+            nonlocal attempts
+            attempts += 1
+            return await self._execute(query)
+
+        result = await retry_with_backoff(insert, should_retry=_is_transient_error)
+        if result.data:
+            return self._saved_transaction(transaction, result.data)
+
+        if attempts == 1:
+            logger.info(f"Message {transaction.message_id} already recorded, skipping")
+            return None
+
+        # An earlier attempt of this call landed but its response was lost
+        result = await self._execute(
+            self.client.table("transactions")
+            .select("id,created_at,updated_at")
+            .eq("phone_number", transaction.phone_number)
+            .eq("message_id", transaction.message_id)
+        )
+        return self._saved_transaction(transaction, result.data)
+
+    def _saved_transaction(
+        self, transaction: Transaction, rows: list[dict]
+    ) -> Transaction:
+        """Merge the server-generated fields of a written row into transaction."""
+        if not rows:
+            msg = "No data returned from transaction creation"
+            raise ValueError(msg)
+
+        self._forget_balance(transaction.phone_number)
+        created_transaction = rows[0]
+        # Only the server-generated fields are new; keep the rest as sent
+        return transaction.model_copy(
+            update={
+                "id": created_transaction["id"],
+                "created_at": datetime.fromisoformat(created_transaction["created_at"]),
+                "updated_at": datetime.fromisoformat(created_transaction["updated_at"])
+                if created_transaction.get("updated_at")
+                else None,
+            }
+        )
+
     async def update_transaction_type(self, transaction_id: int, new_type: TransactionType) -> bool:
         """Update the transaction type of an existing transaction."""
         try:
-            result = (
+            result = await self._execute(
                 self.client.table("transactions")
                 .update({"transaction_type": new_type.value})
                 .eq("id", transaction_id)
-                .execute()
             )
 
             if result.data:
+                self._forget_balance(result.data[0]["phone_number"])
                 logger.info(f"Updated transaction {transaction_id} to type {new_type.value}")
                 return True
             else:
@@ -93,70 +263,67 @@ class DatabaseManager:
             logger.error(f"Error updating transaction {transaction_id}: {e}")
             return False
 
+    async def correct_transaction_type(
+        self, phone_number: str, transaction_id: int, new_type: TransactionType
+    ) -> Balance | None:
+        """Change a transaction's type and return the updated balance."""
+        try:
+            try:
+                # Update and re-aggregate in one round trip and one transaction
+                result = await self._execute(
+                    self.client.rpc(
+                        "correct_transaction_and_return_balance",
+                        {"txn_id": transaction_id, "new_type": new_type.value},
+                    )
+                )
+            except Exception as e:
+                logger.warning(
+                    f"correct_transaction_and_return_balance RPC failed, "
+                    f"updating directly: {e}"
+                )
+                if not await self.update_transaction_type(transaction_id, new_type):
+                    return None
+                return await self.get_balance(phone_number)
+
+            if not result.data:
+                logger.error(f"No transaction found with ID {transaction_id}")
+                return None
+
+            logger.info(f"Updated transaction {transaction_id} to type {new_type.value}")
+            balance = _balance_from_summary(phone_number, result.data[0])
+            self._forget_balance(phone_number)
+            self._balance_cache.set(phone_number, balance)
+            return balance
+
+        except Exception as e:
+            logger.error(f"Error correcting transaction {transaction_id}: {e}")
+            return None
+
     async def get_balance(self, phone_number: str) -> Balance:
         """Get current balance for a phone number."""
+        cached = self._balance_cache.get(phone_number)
+        if cached is not None:
+            return cached
+
         try:
             logger.info(f"Getting balance for phone_number: '{phone_number}'")
 
-            # Get all transactions for this phone number
-            result = (
-                self.client.table("transactions")
-                .select("*")
-                .eq("phone_number", phone_number)
-                .execute()
-            )
-
-            transactions = result.data
-            logger.info(f"Found {len(transactions)} transactions for {phone_number}")
-
-            if transactions:
-                logger.info(f"Sample transaction: {transactions[0]}")
+            try:
+                # Aggregate server-side so only the totals cross the network
+                result = await self._execute(
+                    self.client.rpc("get_balance_summary", {"phone": phone_number})
+                )
+            except Exception as e:
+                logger.warning(
+                    f"get_balance_summary RPC failed, aggregating client-side: {e}"
+                )
+                balance = await self._aggregate_balance(phone_number)
             else:
-                # Check if there are ANY transactions in the table
-                all_result = self.client.table("transactions").select("phone_number").execute()
-                logger.info(f"All phone numbers in DB: {[t['phone_number'] for t in all_result.data]}")
-
-            total_sales = Decimal("0")
-            total_expenses = Decimal("0")
-            total_adjustments = Decimal("0")
-            last_updated = None
-
-            for transaction in transactions:
-                amount = Decimal(str(transaction["amount"]))
-                description = transaction.get("description", "").lower()
-                
-                if transaction["transaction_type"] == TransactionType.VENTA.value:
-                    # Check if it's a cash adjustment (saldo inicial, agregado, etc.)
-                    if any(keyword in description for keyword in ["saldo inicial", "agregado", "ajuste positivo", "agregado personal"]):
-                        total_adjustments += amount
-                    else:
-                        total_sales += amount
-                elif transaction["transaction_type"] == TransactionType.GASTO.value:
-                    # Check if it's a cash adjustment (retirado, ajuste negativo)
-                    if any(keyword in description for keyword in ["retirado", "ajuste negativo"]):
-                        total_adjustments -= amount  # Subtract because it's a withdrawal
-                    else:
-                        total_expenses += amount
-
-                # Update last_updated with the most recent transaction
-                transaction_date = datetime.fromisoformat(transaction["created_at"])
-                if last_updated is None or transaction_date > last_updated:
-                    last_updated = transaction_date
-
-            # If no transactions, use current time
-            if last_updated is None:
-                last_updated = datetime.now(UTC)
-
-            current_balance = total_sales - total_expenses + total_adjustments
+                summary = result.data[0] if result.data else {}
+                balance = _balance_from_summary(phone_number, summary)
 
-            return Balance(
-                phone_number=phone_number,
-                current_balance=current_balance,
-                total_sales=total_sales,
-                total_expenses=total_expenses,
-                total_adjustments=total_adjustments,
-                last_updated=last_updated,
-            )
+            self._balance_cache.set(phone_number, balance)
+            return balance
 
         except Exception as e:
             logger.error(f"Error getting balance for {phone_number}: {e}")
@@ -167,39 +334,97 @@ class DatabaseManager:
                 total_sales=Decimal("0"),
                 total_expenses=Decimal("0"),
                 total_adjustments=Decimal("0"),
-                last_updated=datetime.utcnow(),
+                last_updated=datetime.now(UTC),
+            )
+
+    async def get_balances(self, phone_numbers: list[str]) -> dict[str, Balance]:
+        """Get balances for several phone numbers in one round trip."""
+        try:
+            result = await self._execute(
+                self.client.rpc("get_balances", {"phones": phone_numbers})
             )
 
+            summaries = {row["phone_number"]: row for row in result.data}
+            balances = {}
+            for phone_number in phone_numbers:
+                balance = _balance_from_summary(
+                    phone_number, summaries.get(phone_number, {})
+                )
+                self._balance_cache.set(phone_number, balance)
+                balances[phone_number] = balance
+
+            return balances
+
+        except Exception as e:
+            logger.error(f"Error getting balances for {len(phone_numbers)} numbers: {e}")
+            return {}
+
+    async def _aggregate_balance(self, phone_number: str) -> Balance:
+        """Compute balance client-side when the summary RPC is unavailable."""
+        # Get all transactions for this phone number
+        result = await self._execute(
+            self.client.table("transactions")
+            .select("transaction_type,amount::text,description,created_at")
+            .eq("phone_number", phone_number)
+            .order("created_at", desc=True)
+        )
+
+        transactions = result.data
+        logger.debug("Found %d transactions for %s", len(transactions), phone_number)
+
+        total_sales = Decimal("0")
+        total_expenses = Decimal("0")
+        total_adjustments = Decimal("0")
+
+        for transaction in transactions:
+            amount = Decimal(transaction["amount"])
+            description = transaction.get("description", "")
+            
+            if transaction["transaction_type"] == TransactionType.VENTA.value:
+                # Check if it's a cash adjustment (saldo inicial, agregado, etc.)
+                if _POSITIVE_ADJUSTMENT_RE.search(description):
+                    total_adjustments += amount
+                else:
+                    total_sales += amount
+            elif transaction["transaction_type"] == TransactionType.GASTO.value:
+                # Check if it's a cash adjustment (retirado, ajuste negativo)
+                if _NEGATIVE_ADJUSTMENT_RE.search(description):
+                    total_adjustments -= amount  # Subtract because it's a withdrawal
+                else:
+                    total_expenses += amount
+
+        # Rows come newest first; if no transactions, use current time
+        last_updated = (
+            datetime.fromisoformat(transactions[0]["created_at"])
+            if transactions
+            else datetime.now(UTC)
+        )
+
+        current_balance = total_sales - total_expenses + total_adjustments
+
+        return Balance(
+            phone_number=phone_number,
+            current_balance=current_balance,
+            total_sales=total_sales,
+            total_expenses=total_expenses,
+            total_adjustments=total_adjustments,
+            last_updated=last_updated,
+        )
+
     async def get_recent_transactions(
         self, phone_number: str, limit: int = 10
     ) -> list[Transaction]:
         """Get recent transactions for a phone number."""
         try:
-            result = (
+            result = await self._execute(
                 self.client.table("transactions")
-                .select("*")
+                .select(_TRANSACTION_COLUMNS)
                 .eq("phone_number", phone_number)
                 .order("created_at", desc=True)
                 .limit(limit)
-                .execute()
             )
 
-            transactions = []
-            for data in result.data:
-                transaction = Transaction(
-                    id=data["id"],
-                    phone_number=data["phone_number"],
-                    transaction_type=TransactionType(data["transaction_type"]),
-                    amount=Decimal(str(data["amount"])),
-                    description=data["description"],
-                    created_at=datetime.fromisoformat(data["created_at"]),
-                    updated_at=datetime.fromisoformat(data["updated_at"])
-                    if data.get("updated_at")
-                    else None,
-                )
-                transactions.append(transaction)
-
-            return transactions
+            return [_row_to_transaction(data) for data in result.data]
 
         except Exception as e:
             logger.error(f"Error getting recent transactions for {phone_number}: {e}")
@@ -208,48 +433,107 @@ class DatabaseManager:
     async def get_daily_expense_average(self, phone_number: str) -> Decimal:
         """Calculate daily average expenses for cash flow estimation."""
         try:
-            # Get transactions from last 30 days
-            from datetime import timedelta
-            thirty_days_ago = (datetime.now(UTC) - timedelta(days=30)).isoformat()
-            
-            result = (
-                self.client.table("transactions")
-                .select("*")
-                .eq("phone_number", phone_number)
-                .gte("created_at", thirty_days_ago)
-                .execute()
-            )
+            # Get expense stats from last 30 days
+            since = datetime.now(UTC) - timedelta(days=30)
+
+            try:
+                result = await self._execute(
+                    self.client.rpc(
+                        "daily_expense_stats",
+                        {"phone": phone_number, "since": since.isoformat()},
+                    )
+                )
+            except Exception as e:
+                logger.warning(
+                    f"daily_expense_stats RPC failed, aggregating client-side: {e}"
+                )
+                total_expenses, expense_days = await self._aggregate_expense_stats(
+                    phone_number, since
+                )
+            else:
+                stats = result.data[0] if result.data else {}
+                total_expenses = Decimal(str(stats.get("total") or 0))
+                expense_days = stats.get("days") or 0
+
+            return _daily_average(total_expenses, expense_days)
 
-            total_expenses = Decimal("0")
-            expense_days = set()
-            
-            for transaction in result.data:
-                transaction_date = datetime.fromisoformat(transaction["created_at"]).date()
-                description = transaction.get("description", "").lower()
-                
-                if transaction["transaction_type"] == TransactionType.GASTO.value:
-                    # Check if it's a real expense (not cash adjustment)
-                    if not any(keyword in description for keyword in ["retirado", "ajuste negativo"]):
-                        total_expenses += Decimal(str(transaction["amount"]))
-                        expense_days.add(transaction_date)
-            
-            # If we have expenses, calculate daily average
-            if expense_days and total_expenses > 0:
-                return total_expenses / len(expense_days)
-            
-            # Fallback: assume $100 daily expenses if no data
-            return Decimal("100")
-            
         except Exception as e:
             logger.error(f"Error calculating daily expenses for {phone_number}: {e}")
             return Decimal("100")  # Safe fallback
 
+    async def _aggregate_expense_stats(
+        self, phone_number: str, since: datetime
+    ) -> tuple[Decimal, int]:
+        """Sum real expenses and count expense days client-side."""
+        result = await self._execute(
+            self.client.table("transactions")
+            .select("transaction_type,amount::text,description,created_at")
+            .eq("phone_number", phone_number)
+            .gte("created_at", since.isoformat())
+        )
+
+        total_expenses = Decimal("0")
+        expense_days = set()
+
+        for transaction in result.data:
+            description = transaction.get("description", "")
+
+            if transaction["transaction_type"] == TransactionType.GASTO.value:
+                # Check if it's a real expense (not cash adjustment)
+                if not _NEGATIVE_ADJUSTMENT_RE.search(description):
+                    total_expenses += Decimal(transaction["amount"])
+                    expense_days.add(
+                        datetime.fromisoformat(transaction["created_at"]).date()
+                    )
+
+        return total_expenses, len(expense_days)
+
+    async def get_account_snapshot(self, phone_number: str) -> AccountSnapshot:
+        """Get balance, daily expense average and low-balance flag together."""
+        cached = self._snapshot_cache.get(phone_number)
+        if cached is not None:
+            return cached
+
+        since = datetime.now(UTC) - timedelta(days=30)
+
+        try:
+            result = await self._execute(
+                self.client.rpc(
+                    "get_account_snapshot",
+                    {"phone": phone_number, "since": since.isoformat()},
+                )
+            )
+        except Exception as e:
+            logger.warning(
+                f"get_account_snapshot RPC failed, querying separately: {e}"
+            )
+            balance, daily_expense_average = await asyncio.gather(
+                self.get_balance(phone_number),
+                self.get_daily_expense_average(phone_number),
+            )
+        else:
+            row = result.data[0] if result.data else {}
+            balance = _balance_from_summary(phone_number, row)
+            self._balance_cache.set(phone_number, balance)
+            daily_expense_average = _daily_average(
+                Decimal(str(row.get("expense_total") or 0)),
+                row.get("expense_days") or 0,
+            )
+
+        snapshot = AccountSnapshot(
+            balance=balance,
+            daily_expense_average=daily_expense_average,
+            low_balance=self.check_low_balance_alert(balance),
+        )
+        self._snapshot_cache.set(phone_number, snapshot)
+        return snapshot
+
     async def search_transactions(self, phone_number: str, search_term: str, transaction_type: str = None) -> list[Transaction]:
         """Search transactions by description and optionally by type."""
         try:
             query = (
                 self.client.table("transactions")
-                .select("*")
+                .select(_TRANSACTION_COLUMNS)
                 .eq("phone_number", phone_number)
                 .ilike("description", f"%{search_term}%")  # Case-insensitive search
                 .order("created_at", desc=True)
@@ -260,35 +544,14 @@ class DatabaseManager:
             if transaction_type:
                 query = query.eq("transaction_type", transaction_type)
             
-            result = query.execute()
-
-            transactions = []
-            for data in result.data:
-                transaction = Transaction(
-                    id=data["id"],
-                    phone_number=data["phone_number"],
-                    transaction_type=TransactionType(data["transaction_type"]),
-                    amount=Decimal(str(data["amount"])),
-                    description=data["description"],
-                    created_at=datetime.fromisoformat(data["created_at"]),
-                    updated_at=datetime.fromisoformat(data["updated_at"])
-                    if data.get("updated_at")
-                    else None,
-                )
-                transactions.append(transaction)
+            result = await self._execute(query)
 
-            return transactions
+            return [_row_to_transaction(data) for data in result.data]
 
         except Exception as e:
             logger.error(f"Error searching transactions for {phone_number}: {e}")
             return []
 
-    async def check_low_balance_alert(self, phone_number: str) -> bool:
-        """Check if balance is below alert threshold."""
-        try:
-            balance = await self.get_balance(phone_number)
-            settings = get_settings()
-            return balance.current_balance < Decimal(str(settings.minimum_balance_alert))
-        except Exception as e:
-            logger.error(f"Error checking low balance alert for {phone_number}: {e}")
-            return False
+    def check_low_balance_alert(self, balance: Balance) -> bool:
+        """Check if an already-fetched balance is below alert threshold."""
+        return balance.current_balance < self._minimum_balance_alert
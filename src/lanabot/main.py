@@ -1,15 +1,24 @@
 """Main FastAPI application for LanaBot."""
 
+import asyncio
 import logging
+import re
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import UTC, datetime
 
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, Response
 
 from .config import get_settings
 from .database import DatabaseManager
-from .models import Transaction, WhatsAppMessage
+from .models import (
+    Balance,
+    PendingTransaction,
+    Transaction,
+    TransactionType,
+    WhatsAppMessage,
+    WhatsAppWebhook,
+)
 from .openai_client import OpenAIClient
 from .pending_manager import pending_manager
 from .whatsapp_client import WhatsAppClient
@@ -23,6 +32,139 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _alternation(phrases: tuple[str, ...]) -> str:
+    """Build a regex alternation matching any of the literal phrases."""
+    return "|".join(re.escape(phrase) for phrase in phrases)
+
+
+# Message matchers, built once instead of per message; they all expect text
+# already lowercased and stripped by process_message
+_BALANCE_INQUIRY_RE = re.compile(r"saldo|balance|cu[áa]nto tengo|dinero|estado|resumen|cuentas")
+# Whole words only, so e.g. "hi" doesn't fire on "chicharrones"
+_WELCOME_RE = re.compile(r"\b(?:" + _alternation((
+    "hola", "hello", "hi", "buenas", "buenos días", "buenas tardes", "buenas noches",
+    "ayuda", "help", "cómo funciona", "como funciona", "qué hace", "que hace",
+    "instrucciones", "tutorial", "empezar", "iniciar", "comenzar",
+)) + r")\b")
+# Search phrase, then the search term minus a trailing "hoy"/"ayer" and "?"
+_SEARCH_TERM = r"\s*(?P<term>.*?)\s*(?:\b(?:hoy|ayer)\b)?[\s?]*$"
+# Checked in order, so expense phrases win when a message has both kinds
+_SEARCH_PATTERNS = (
+    (
+        re.compile("(?:" + _alternation((
+            "cuánto gasté en", "cuanto gaste en", "gastos de", "gasté de", "gaste de",
+            "compré de", "compre de", "cuánto pagué", "cuanto pague",
+        )) + ")" + _SEARCH_TERM),
+        "gasto",
+    ),
+    (
+        re.compile("(?:" + _alternation((
+            "cuánto vendí de", "cuanto vendi de", "ventas de", "vendí de", "vendi de",
+            "cuánto gané", "cuanto gane", "cuánto saqué", "cuanto saque",
+        )) + ")" + _SEARCH_TERM),
+        "venta",
+    ),
+)
+_VENTA_CORRECTIONS = frozenset({"venta", "vendí", "vendi", "es venta"})
+_GASTO_CORRECTIONS = frozenset({"gasto", "compra", "compre", "compré", "es gasto"})
+
+# Reply templates; balance fields are read straight off the Balance model
+_BALANCE_SUMMARY_TPL = (
+    "💰 Saldo actual: ${balance.current_balance:.2f} MXN\n"
+    "📈 Total ventas: ${balance.total_sales:.2f}\n"
+    "📉 Total gastos: ${balance.total_expenses:.2f}\n"
+    "🔄 Total ajustes: ${balance.total_adjustments:.2f}"
+)
+_CONFIRMATION_TPL = (
+    "✅ Registré {type_es} de ${amount} ({description})\n\n" + _BALANCE_SUMMARY_TPL
+)
+_CORRECTION_TPL = (
+    "✅ Corregido a {type_es} de ${amount} ({description})\n\n" + _BALANCE_SUMMARY_TPL
+)
+_LOW_BALANCE_ALERT_TPL = (
+    "🚨 ¡Aguas! Tu saldo está muy bajo: ${balance.current_balance:.2f}. "
+    "Considera hacer más ventas o reducir gastos."
+)
+
+_AUDIO_NOT_UNDERSTOOD_MSG = (
+    "¡Órale! No pude entender el audio. "
+    "¿Puedes intentar de nuevo o escribir tu mensaje? 🎤"
+)
+
+# Meta webhook bodies are a few KB; anything far larger is not from Meta
+_MAX_WEBHOOK_BYTES = 256 * 1024
+
+# Pre-serialized webhook acknowledgement, skipping FastAPI's JSON encoding
+_WEBHOOK_ACK = b'{"status":"ok"}'
+
+# Fire-and-forget tasks, referenced until they finish
+_background_tasks: set[asyncio.Task] = set()
+# Meta won't redeliver an acknowledged message, so shutdown waits for these
+_SHUTDOWN_DRAIN_SECONDS = 25.0
+
+
+# One lock per sender with a count of tasks using it, dropped when idle
+_sender_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+
+@asynccontextmanager
+async def sender_lock(phone_number: str):
+    """Serialize message handling per sender, in arrival order."""
+    lock, users = _sender_locks.get(phone_number, (None, 0))
+    lock = lock or asyncio.Lock()
+    _sender_locks[phone_number] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _sender_locks[phone_number]
+        if users == 1:
+            del _sender_locks[phone_number]
+        else:
+            _sender_locks[phone_number] = (lock, users - 1)
+
+
+def _with_low_balance_alert(message: str, balance: Balance, low: bool) -> str:
+    """Append the low balance alert to a reply when the balance is low."""
+    # The alert rides along in the same message (one send, kept in order)
+    if not low:
+        return message
+    return message + "\n\n" + _LOW_BALANCE_ALERT_TPL.format(balance=balance)
+
+
+async def read_limited_body(request: Request, max_bytes: int) -> bytes:
+    """Read the request body, failing with 413 once it exceeds max_bytes."""
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail="Payload too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def run_in_background(coro) -> None:
+    """Schedule a coroutine without awaiting it."""
+    task = asyncio.create_task(coro)
+    # Keep a reference so the task isn't garbage-collected before it runs
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def drain_background_tasks(timeout: float) -> None:
+    """Wait for in-flight background tasks, cancelling any left after timeout."""
+    if not _background_tasks:
+        return
+    logger.info(f"Waiting for {len(_background_tasks)} message(s) in progress...")
+    _, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    if pending:
+        logger.warning(f"Cancelling {len(pending)} message(s) still in progress")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan context manager."""
@@ -36,6 +178,11 @@ async def lifespan(app: FastAPI):
     logger.info("LanaBot application started successfully!")
     yield
     logger.info("Shutting down LanaBot application...")
+    await drain_background_tasks(_SHUTDOWN_DRAIN_SECONDS)
+    # Only close the pools once no task can still be using them
+    await asyncio.gather(
+        app.state.whatsapp_client.aclose(), app.state.openai_client.aclose()
+    )
 
 
 app = FastAPI(
@@ -49,7 +196,7 @@ app = FastAPI(
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now(UTC).isoformat()}
 
 
 @app.get("/webhook")
@@ -72,87 +219,89 @@ async def verify_webhook(
 @app.post("/webhook")
 async def webhook_handler(request: Request):
     """Handle incoming Meta WhatsApp webhook messages."""
+    # Reject probes and oversized bodies from the headers, before reading the body
+    if not request.headers.get("content-type", "").startswith("application/json"):
+        raise HTTPException(status_code=415, detail="Unsupported media type")
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        if not content_length.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if int(content_length) > _MAX_WEBHOOK_BYTES:
+            raise HTTPException(status_code=413, detail="Payload too large")
+
+    # The header is optional (chunked uploads), so cap what is actually read
+    body = await read_limited_body(request, _MAX_WEBHOOK_BYTES)
+
     try:
-        # Get JSON data (Meta sends JSON, not form data)
-        body = await request.body()
-        data = await request.json()
+        # Parse and validate the JSON body in one pass (Meta sends JSON, not form data)
+        payload = WhatsAppWebhook.model_validate_json(body)
 
         # Skip signature verification for now to debug
         # TODO: Implement proper signature verification later
-        logger.info(f"Received webhook from Meta: {data}")
+        logger.debug("Received webhook from Meta: %s", payload)
 
         # Handle webhook verification (Meta sends this on setup)
-        if data.get("object") == "whatsapp_business_account":
-            entries = data.get("entry", [])
-
-            for entry in entries:
-                changes = entry.get("changes", [])
-
-                for change in changes:
-                    if change.get("field") == "messages":
-                        value = change.get("value", {})
-                        messages = value.get("messages", [])
-
-                        for message in messages:
-                            # Extract message information from Meta webhook
-                            message_id = message.get("id")
-                            from_number = message.get("from")
-                            timestamp = message.get("timestamp")
-
+        if payload.object == "whatsapp_business_account":
+            for entry in payload.entry:
+                for change in entry.changes:
+                    if change.field == "messages":
+                        for message in change.value.messages:
                             # Determine message type and content
-                            message_type = message.get("type", "text")
+                            message_type = message.type
                             content = None
                             audio_url = None
                             image_url = None
 
-                            if message_type == "text":
-                                content = message.get("text", {}).get("body")
-                            elif message_type == "audio":
-                                audio_info = message.get("audio", {})
-                                audio_url = audio_info.get("id")  # Media ID for Meta
-                            elif message_type == "image":
-                                image_info = message.get("image", {})
-                                image_url = image_info.get("id")  # Media ID for Meta
+                            if message_type == "text" and message.text:
+                                content = message.text.body
+                            elif message_type == "audio" and message.audio:
+                                audio_url = message.audio.id  # Media ID for Meta
+                            elif message_type == "image" and message.image:
+                                image_url = message.image.id  # Media ID for Meta
 
-                            if not all([message_id, from_number]):
+                            if not all([message.id, message.from_number]):
                                 logger.warning("Missing required message fields from Meta")
                                 continue
 
-                            # Create WhatsApp message object
-                            whatsapp_message = WhatsAppMessage(
-                                message_id=message_id,
-                                from_number=from_number,
+                            # Fields were already validated by WhatsAppWebhook,
+                            # so skip a second validation pass
+                            whatsapp_message = WhatsAppMessage.model_construct(
+                                message_id=message.id,
+                                from_number=message.from_number,
                                 message_type=message_type,
                                 content=content,
                                 audio_url=audio_url,
                                 image_url=image_url,
-                                timestamp=datetime.fromtimestamp(int(timestamp)) if timestamp else datetime.utcnow(),
+                                timestamp=message.timestamp,
                             )
 
-                            # Process the message
-                            await process_message(whatsapp_message)
+                            if not pending_manager.mark_message_seen(message.id):
+                                logger.info(f"Skipping duplicate delivery of {message.id}")
+                                continue
+
+                            # Acknowledge Meta right away; processing can take
+                            # seconds and a slow ACK makes Meta redeliver
+                            run_in_background(process_message(whatsapp_message))
 
-        return {"status": "ok"}
+        return Response(content=_WEBHOOK_ACK, media_type="application/json")
 
     except Exception as e:
         logger.error(f"Error processing Meta webhook: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-# Legacy function - no longer used with Twilio
-# async def process_whatsapp_change(value: dict) -> None:
-#     """Process WhatsApp webhook change - Legacy Meta API function."""
-#     pass
-
-
-async def handle_processed_transaction(phone_number: str, processed_transaction) -> None:
+async def handle_processed_transaction(
+    phone_number: str, processed_transaction, message_id: str | None = None
+) -> None:
     """Handle a processed transaction based on confidence level."""
     try:
         confidence = processed_transaction.confidence
 
         if confidence >= 0.8:
             # High confidence - auto-process with confirmation option
-            await process_transaction_with_confirmation(phone_number, processed_transaction)
+            await process_transaction_with_confirmation(
+                phone_number, processed_transaction, message_id
+            )
         else:
             # Low confidence - ask for clarification
             pending_manager.add_pending(phone_number, processed_transaction)
@@ -170,7 +319,9 @@ async def handle_processed_transaction(phone_number: str, processed_transaction)
         logger.error(f"Error handling processed transaction: {e}")
 
 
-async def process_transaction_with_confirmation(phone_number: str, processed_transaction) -> None:
+async def process_transaction_with_confirmation(
+    phone_number: str, processed_transaction, message_id: str | None = None
+) -> None:
     """Process transaction and offer correction option."""
     try:
         # Create and save transaction
@@ -179,19 +330,20 @@ async def process_transaction_with_confirmation(phone_number: str, processed_tra
             transaction_type=processed_transaction.transaction_type,
             amount=processed_transaction.amount,
             description=processed_transaction.description,
+            message_id=message_id,
         )
 
         saved_transaction = await app.state.db.create_transaction(transaction)
+        if saved_transaction is None:
+            # Meta redelivered a message we already recorded and answered
+            return
         logger.info(f"Transaction created with confirmation: {saved_transaction}")
+        app.state.openai_client.forget_recent_parse(phone_number)
 
-        # Get updated balance and cash flow estimation
-        balance = await app.state.db.get_balance(phone_number)
-        daily_expenses = await app.state.db.get_daily_expense_average(phone_number)
-        
-        # Calculate cash flow duration
-        days_remaining = None
-        if balance.current_balance > 0 and daily_expenses > 0:
-            days_remaining = float(balance.current_balance / daily_expenses)
+        # Get updated balance and cash flow estimation in one round trip
+        snapshot = await app.state.db.get_account_snapshot(phone_number)
+        balance = snapshot.balance
+        days_remaining = snapshot.days_remaining
 
         # Generate response with correction option
         if processed_transaction.transaction_type.value == "venta":
@@ -204,12 +356,12 @@ async def process_transaction_with_confirmation(phone_number: str, processed_tra
             transaction_type_es = "AJUSTE DE CAJA"
             opposite_type = "VENTA o GASTO"
 
-        response_message = f"""✅ Registré {transaction_type_es} de ${processed_transaction.amount} ({processed_transaction.description})
-
-💰 Saldo actual: ${balance.current_balance:.2f} MXN
-📈 Total ventas: ${balance.total_sales:.2f}
-📉 Total gastos: ${balance.total_expenses:.2f}
-🔄 Total ajustes: ${balance.total_adjustments:.2f}"""
+        response_message = _CONFIRMATION_TPL.format(
+            type_es=transaction_type_es,
+            amount=processed_transaction.amount,
+            description=processed_transaction.description,
+            balance=balance,
+        )
 
         # Add cash flow estimation
         if days_remaining is not None:
@@ -223,6 +375,10 @@ async def process_transaction_with_confirmation(phone_number: str, processed_tra
 
         response_message += f"\n\n❌ ¿Está mal? Responde {opposite_type} para corregir"
 
+        response_message = _with_low_balance_alert(
+            response_message, balance, snapshot.low_balance
+        )
+
         # Send regular message directly (skip template for now)
         logger.info(f"Sending confirmation message to {phone_number}")
         await app.state.whatsapp_client.send_message(phone_number, response_message)
@@ -230,56 +386,39 @@ async def process_transaction_with_confirmation(phone_number: str, processed_tra
         # Store transaction ID for potential correction
         pending_manager.add_pending(phone_number, processed_transaction, saved_transaction.id)
 
-        # Check for low balance alert
-        if await app.state.db.check_low_balance_alert(phone_number):
-            alert_message = f"🚨 ¡Aguas! Tu saldo está muy bajo: ${balance.current_balance:.2f}. Considera hacer más ventas o reducir gastos."
-            await app.state.whatsapp_client.send_message(phone_number, alert_message)
-
     except Exception as e:
         logger.error(f"Error processing transaction with confirmation: {e}")
 
 
-def is_correction_command(text: str) -> str | None:
-    """Check if text is a correction command and return the type."""
-    text_clean = text.strip().lower()
-
-    if text_clean in ["venta", "vendí", "vendi", "es venta"]:
+def is_correction_command(text_norm: str) -> str | None:
+    """Check if normalized text is a correction command and return the type."""
+    if text_norm in _VENTA_CORRECTIONS:
         return "venta"
-    elif text_clean in ["gasto", "compra", "compre", "compré", "es gasto"]:
+    elif text_norm in _GASTO_CORRECTIONS:
         return "gasto"
 
     return None
 
 
-async def handle_transaction_correction(phone_number: str, correction_type: str) -> None:
-    """Handle transaction type correction."""
+async def handle_transaction_correction(
+    phone_number: str, correction_type: str, pending: PendingTransaction
+) -> None:
+    """Apply a correction to a pending transaction already taken off the manager."""
     try:
-        pending = pending_manager.get_pending(phone_number)
-        if not pending:
-            await app.state.whatsapp_client.send_message(
-                phone_number,
-                "No hay transacciones pendientes de corrección 🤔"
-            )
-            return
-
-        # Remove from pending
-        pending_manager.remove_pending(phone_number)
-
-        from .models import TransactionType
         new_type = TransactionType(correction_type)
 
         # If we have a transaction ID, update the existing transaction
         if pending.transaction_id:
-            success = await app.state.db.update_transaction_type(pending.transaction_id, new_type)
+            balance = await app.state.db.correct_transaction_type(
+                phone_number, pending.transaction_id, new_type
+            )
 
-            if not success:
+            if balance is None:
                 await app.state.whatsapp_client.send_message(
                     phone_number,
                     "Error al corregir la transacción. Intenta de nuevo 😕"
                 )
                 return
-
-            logger.info(f"Updated transaction {pending.transaction_id} to {new_type.value}")
         else:
             # Fallback: create new transaction (shouldn't happen with new flow)
             transaction = Transaction(
@@ -291,9 +430,10 @@ async def handle_transaction_correction(phone_number: str, correction_type: str)
 
             saved_transaction = await app.state.db.create_transaction(transaction)
             logger.info(f"Created corrected transaction: {saved_transaction}")
+            app.state.openai_client.forget_recent_parse(phone_number)
 
-        # Get updated balance
-        balance = await app.state.db.get_balance(phone_number)
+            # Get updated balance
+            balance = await app.state.db.get_balance(phone_number)
 
         # Generate response
         if correction_type == "venta":
@@ -303,44 +443,59 @@ async def handle_transaction_correction(phone_number: str, correction_type: str)
         else:  # ajuste_caja
             transaction_type_es = "AJUSTE DE CAJA"
 
-        response_message = f"""✅ Corregido a {transaction_type_es} de ${pending.amount} ({pending.description})
+        response_message = _CORRECTION_TPL.format(
+            type_es=transaction_type_es,
+            amount=pending.amount,
+            description=pending.description,
+            balance=balance,
+        )
 
-💰 Saldo actual: ${balance.current_balance:.2f} MXN
-📈 Total ventas: ${balance.total_sales:.2f}
-📉 Total gastos: ${balance.total_expenses:.2f}
-🔄 Total ajustes: ${balance.total_adjustments:.2f}"""
+        response_message = _with_low_balance_alert(
+            response_message, balance, app.state.db.check_low_balance_alert(balance)
+        )
 
         # Send regular message directly (skip template for now)
         logger.info(f"Sending correction confirmation to {phone_number}")
         await app.state.whatsapp_client.send_message(phone_number, response_message)
 
-        # Check for low balance alert
-        if await app.state.db.check_low_balance_alert(phone_number):
-            alert_message = f"🚨 ¡Aguas! Tu saldo está muy bajo: ${balance.current_balance:.2f}. Considera hacer más ventas o reducir gastos."
-            await app.state.whatsapp_client.send_message(phone_number, alert_message)
-
     except Exception as e:
         logger.error(f"Error handling transaction correction: {e}")
 
 
 async def process_message(message: WhatsAppMessage) -> None:
+    """Process a WhatsApp message once earlier ones from the same sender finish."""
+    # Keeps a burst from one user ordered and off the shared pending state
+    async with sender_lock(message.from_number):
+        await _process_message(message)
+
+
+async def _process_message(message: WhatsAppMessage) -> None:
     """Process a WhatsApp message and handle transaction logic."""
     try:
+        text_to_process = message.content
+        # Lowercased/stripped once here and shared by all the is_* predicates
+        text_norm = text_to_process.lower().strip() if text_to_process else ""
+
         # First check if this is a correction command
-        if message.message_type == "text" and message.content:
-            correction_type = is_correction_command(message.content)
-            if correction_type and pending_manager.has_pending(message.from_number):
-                await handle_transaction_correction(message.from_number, correction_type)
+        if message.message_type == "text" and text_norm:
+            correction_type = is_correction_command(text_norm)
+            pending = (
+                pending_manager.pop_pending(message.from_number)
+                if correction_type
+                else None
+            )
+            if pending:
+                await handle_transaction_correction(
+                    message.from_number, correction_type, pending
+                )
                 return
 
-        text_to_process = message.content
-
         # If it's an audio message, transcribe it first
         if message.message_type == "audio" and message.audio_url:
-            # Download the audio file from Twilio
-            audio_file_path = await app.state.whatsapp_client.download_media(message.audio_url)
+            # Download the audio from Meta into memory
+            media = await app.state.whatsapp_client.download_media(message.audio_url)
 
-            if not audio_file_path:
+            if not media:
                 await app.state.whatsapp_client.send_message(
                     message.from_number,
                     "¡Órale! No pude descargar el audio. ¿Puedes intentar de nuevo? 🎤",
@@ -348,45 +503,34 @@ async def process_message(message: WhatsAppMessage) -> None:
                 return
 
             try:
+                audio, mime_type = media
                 text_to_process = await app.state.openai_client.transcribe_audio(
-                    audio_file_path
+                    audio, mime_type
                 )
 
-                # Clean up temporary file
-                import os
-                try:
-                    os.unlink(audio_file_path)
-                except Exception:
-                    pass  # Ignore cleanup errors
-
             except Exception as e:
                 logger.error(f"Error transcribing audio: {e}")
-                # Clean up temporary file on error too
-                import os
-                try:
-                    os.unlink(audio_file_path)
-                except Exception:
-                    pass
-
                 await app.state.whatsapp_client.send_message(
                     message.from_number,
-                    "¡Órale! No pude entender el audio. ¿Puedes intentar de nuevo o escribir tu mensaje? 🎤",
+                    _AUDIO_NOT_UNDERSTOOD_MSG,
                 )
                 return
 
             if not text_to_process:
                 await app.state.whatsapp_client.send_message(
                     message.from_number,
-                    "¡Órale! No pude entender el audio. ¿Puedes intentar de nuevo o escribir tu mensaje? 🎤",
+                    _AUDIO_NOT_UNDERSTOOD_MSG,
                 )
                 return
 
+            text_norm = text_to_process.lower().strip()
+
         # If it's an image message, process the ticket
         elif message.message_type == "image" and message.image_url:
-            # Download the image file from Twilio
-            image_file_path = await app.state.whatsapp_client.download_media(message.image_url)
+            # Download the image from Meta into memory
+            media = await app.state.whatsapp_client.download_media(message.image_url)
 
-            if not image_file_path:
+            if not media:
                 await app.state.whatsapp_client.send_message(
                     message.from_number,
                     "¡Órale! No pude descargar la imagen. ¿Puedes intentar de nuevo? 📸",
@@ -394,17 +538,11 @@ async def process_message(message: WhatsAppMessage) -> None:
                 return
 
             try:
+                image, mime_type = media
                 processed_transaction = await app.state.openai_client.process_ticket_image(
-                    image_file_path
+                    image, mime_type
                 )
 
-                # Clean up temporary file
-                import os
-                try:
-                    os.unlink(image_file_path)
-                except Exception:
-                    pass  # Ignore cleanup errors
-
                 if not processed_transaction:
                     await app.state.whatsapp_client.send_message(
                         message.from_number,
@@ -413,18 +551,13 @@ async def process_message(message: WhatsAppMessage) -> None:
                     return
 
                 # Handle based on confidence level
-                await handle_processed_transaction(message.from_number, processed_transaction)
+                await handle_processed_transaction(
+                    message.from_number, processed_transaction, message.message_id
+                )
                 return
 
             except Exception as e:
                 logger.error(f"Error processing ticket image: {e}")
-                # Clean up temporary file on error too
-                import os
-                try:
-                    os.unlink(image_file_path)
-                except Exception:
-                    pass
-
                 await app.state.whatsapp_client.send_message(
                     message.from_number,
                     "¡Órale! No pude leer el ticket. ¿Puedes tomar otra foto más clara? 📸",
@@ -438,24 +571,24 @@ async def process_message(message: WhatsAppMessage) -> None:
 
         # Now check for special commands (works for both text and transcribed audio)
         # Check if it's a welcome/help inquiry
-        if is_welcome_inquiry(text_to_process):
+        if is_welcome_inquiry(text_norm):
             await handle_welcome_inquiry(message.from_number)
             return
 
         # Check if it's a search inquiry
-        is_search, search_term, transaction_type = is_search_inquiry(text_to_process)
+        is_search, search_term, transaction_type = is_search_inquiry(text_norm)
         if is_search:
             await handle_search_inquiry(message.from_number, search_term, transaction_type)
             return
 
         # Check if it's a balance inquiry
-        if is_balance_inquiry(text_to_process):
+        if is_balance_inquiry(text_norm):
             await handle_balance_inquiry(message.from_number)
             return
 
         # Process transaction with OpenAI
         processed_transaction = await app.state.openai_client.process_transaction_text(
-            text_to_process
+            text_to_process, message.from_number
         )
 
         if not processed_transaction:
@@ -466,7 +599,9 @@ async def process_message(message: WhatsAppMessage) -> None:
             return
 
         # Handle transaction with new smart confirmation flow
-        await handle_processed_transaction(message.from_number, processed_transaction)
+        await handle_processed_transaction(
+            message.from_number, processed_transaction, message.message_id
+        )
 
     except Exception as e:
         logger.error(f"Error processing message {message.message_id}: {e}")
@@ -476,70 +611,24 @@ async def process_message(message: WhatsAppMessage) -> None:
         )
 
 
-def is_welcome_inquiry(text: str) -> bool:
-    """Check if the message is a greeting or help request."""
-    welcome_keywords = [
-        "hola", "hello", "hi", "buenas", "buenos días", "buenas tardes", "buenas noches",
-        "ayuda", "help", "cómo funciona", "como funciona", "qué hace", "que hace",
-        "instrucciones", "tutorial", "empezar", "iniciar", "comenzar"
-    ]
-    
-    text_lower = text.lower().strip()
-    return any(keyword in text_lower for keyword in welcome_keywords)
-
-
-def is_search_inquiry(text: str) -> tuple[bool, str, str]:
-    """Check if the message is a search request. Returns (is_search, search_term, transaction_type)."""
-    text_lower = text.lower().strip()
-    
-    # Search patterns for expenses
-    expense_patterns = [
-        "cuánto gasté en", "cuanto gaste en", "gastos de", "gasté de", "gaste de",
-        "compré de", "compre de", "cuánto pagué", "cuanto pague"
-    ]
-    
-    # Search patterns for sales  
-    sales_patterns = [
-        "cuánto vendí de", "cuanto vendi de", "ventas de", "vendí de", "vendi de",
-        "cuánto gané", "cuanto gane", "cuánto saqué", "cuanto saque"
-    ]
-    
-    # Check for expense searches
-    for pattern in expense_patterns:
-        if pattern in text_lower:
-            # Extract search term after the pattern
-            search_term = text_lower.split(pattern, 1)[1].strip()
-            # Remove common endings like "?", "hoy", "ayer"
-            search_term = search_term.replace("?", "").replace("hoy", "").replace("ayer", "").strip()
-            if search_term:
-                return True, search_term, "gasto"
-    
-    # Check for sales searches
-    for pattern in sales_patterns:
-        if pattern in text_lower:
-            search_term = text_lower.split(pattern, 1)[1].strip()
-            search_term = search_term.replace("?", "").replace("hoy", "").replace("ayer", "").strip()
-            if search_term:
-                return True, search_term, "venta"
-    
-    return False, "", ""
+def is_welcome_inquiry(text_norm: str) -> bool:
+    """Check if the normalized message is a greeting or help request."""
+    return _WELCOME_RE.search(text_norm) is not None
 
 
-def is_balance_inquiry(text: str) -> bool:
-    """Check if the message is asking for balance information."""
-    balance_keywords = [
-        "saldo",
-        "balance",
-        "cuánto tengo",
-        "cuanto tengo",
-        "dinero",
-        "estado",
-        "resumen",
-        "cuentas",
-    ]
+def is_search_inquiry(text_norm: str) -> tuple[bool, str, str]:
+    """Check if the normalized message is a search request. Returns (is_search, search_term, transaction_type)."""
+    for search_re, transaction_type in _SEARCH_PATTERNS:
+        match = search_re.search(text_norm)
+        if match and match.group("term"):
+            return True, match.group("term"), transaction_type
+
+    return False, "", ""
 
-    text_lower = text.lower()
-    return any(keyword in text_lower for keyword in balance_keywords)
+
+def is_balance_inquiry(text_norm: str) -> bool:
+    """Check if the normalized message is asking for balance information."""
+    return _BALANCE_INQUIRY_RE.search(text_norm) is not None
 
 
 async def handle_search_inquiry(phone_number: str, search_term: str, transaction_type: str) -> None:
@@ -615,24 +704,19 @@ async def handle_welcome_inquiry(phone_number: str) -> None:
 async def handle_balance_inquiry(phone_number: str) -> None:
     """Handle balance inquiry request."""
     try:
-        balance = await app.state.db.get_balance(phone_number)
-        daily_expenses = await app.state.db.get_daily_expense_average(phone_number)
-        
-        # Calculate cash flow duration
-        days_remaining = None
-        if balance.current_balance > 0 and daily_expenses > 0:
-            days_remaining = float(balance.current_balance / daily_expenses)
+        snapshot = await app.state.db.get_account_snapshot(phone_number)
+        balance = snapshot.balance
 
         balance_info = {
             "current_balance": balance.current_balance,
             "total_sales": balance.total_sales,
             "total_expenses": balance.total_expenses,
             "total_adjustments": balance.total_adjustments,
-            "days_remaining": days_remaining,
+            "days_remaining": snapshot.days_remaining,
         }
 
         response_message = await app.state.openai_client.generate_response_message(
-            balance_info, transaction_added=False
+            balance_info
         )
 
         await app.state.whatsapp_client.send_message(phone_number, response_message)
@@ -654,5 +738,7 @@ if __name__ == "__main__":
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
+        # uvicorn can't reload with multiple workers
+        workers=1 if settings.debug else settings.workers,
         log_level=settings.log_level.lower(),
     )
@@ -22,6 +22,7 @@ class Transaction(BaseModel):
     transaction_type: TransactionType = Field(..., description="Type of transaction")
     amount: Decimal = Field(..., description="Transaction amount (can be negative for cash withdrawals)")
     description: str = Field(..., min_length=1, description="Transaction description")
+    message_id: str | None = Field(None, description="WhatsApp message that created it")
     created_at: datetime | None = None
     updated_at: datetime | None = None
 
@@ -40,7 +41,7 @@ class WhatsAppMessage(BaseModel):
     content: str | None = Field(None, description="Text content")
     audio_url: str | None = Field(None, description="Audio file URL")
     image_url: str | None = Field(None, description="Image file URL")
-    timestamp: datetime = Field(..., description="Message timestamp")
+    timestamp: int | None = Field(None, description="Message timestamp (epoch seconds)")
 
 
 class ProcessedTransaction(BaseModel):
@@ -75,15 +76,67 @@ class Balance(BaseModel):
     last_updated: datetime = Field(..., description="Last update timestamp")
 
 
+class AccountSnapshot(BaseModel):
+    """Balance plus cash-flow figures fetched together."""
+
+    balance: Balance = Field(..., description="Current balance")
+    daily_expense_average: Decimal = Field(..., description="Average daily expenses")
+    low_balance: bool = Field(..., description="Balance is below the alert threshold")
+
+    @property
+    def days_remaining(self) -> float | None:
+        """Days the current balance lasts at the average expense rate."""
+        if self.balance.current_balance > 0 and self.daily_expense_average > 0:
+            return float(self.balance.current_balance / self.daily_expense_average)
+        return None
+
+
+class WhatsAppWebhookText(BaseModel):
+    """Text body of a webhook message."""
+
+    body: str | None = None
+
+
+class WhatsAppWebhookMedia(BaseModel):
+    """Media reference (audio/image) of a webhook message."""
+
+    id: str | None = None
+
+
+class WhatsAppWebhookMessage(BaseModel):
+    """Single message inside a webhook change."""
+
+    id: str | None = None
+    from_number: str | None = Field(None, alias="from")
+    timestamp: int | None = None
+    type: str = "text"
+    text: WhatsAppWebhookText | None = None
+    audio: WhatsAppWebhookMedia | None = None
+    image: WhatsAppWebhookMedia | None = None
+
+
+class WhatsAppWebhookValue(BaseModel):
+    """Value of a webhook change; status updates carry no messages."""
+
+    messages: list[WhatsAppWebhookMessage] = []
+
+
+class WhatsAppWebhookChange(BaseModel):
+    """WhatsApp webhook change model."""
+
+    field: str | None = None
+    value: WhatsAppWebhookValue = WhatsAppWebhookValue()
+
+
 class WhatsAppWebhookEntry(BaseModel):
     """WhatsApp webhook entry model."""
 
-    id: str
-    changes: list[dict]
+    id: str = ""
+    changes: list[WhatsAppWebhookChange] = []
 
 
 class WhatsAppWebhook(BaseModel):
     """WhatsApp webhook payload model."""
 
-    object: str
-    entry: list[WhatsAppWebhookEntry]
+    object: str = ""
+    entry: list[WhatsAppWebhookEntry] = []
@@ -1,118 +1,55 @@
 """OpenAI client for transcription and text processing."""
 
+import asyncio
+import base64
+import json
 import logging
+import random
 from decimal import Decimal
+from functools import lru_cache
 from typing import Optional
 
-from openai import AsyncOpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
+from .cache import TTLCache
 from .config import get_settings
 from .models import ProcessedTransaction, TransactionType
 
 
 logger = logging.getLogger(__name__)
 
+# Parses are reused for a day when the same user re-sends the same text;
+# below this confidence the user is asked to confirm, so don't reuse them
+_PARSE_CACHE_TTL = 24 * 60 * 60
+_CACHEABLE_CONFIDENCE = 0.8
 
-class OpenAIClient:
-    """OpenAI client for audio transcription and text processing."""
-
-    def __init__(self) -> None:
-        """Initialize OpenAI client."""
-        settings = get_settings()
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-
-    async def transcribe_audio(self, audio_file_path: str) -> str | None:
-        """Transcribe audio file to text using Whisper."""
-        try:
-            # Try different approaches to handle audio format
-
-            # First, try sending the file as-is with different extensions
-            file_attempts = [
-                (audio_file_path, "original"),
-                # Try copying with different extensions that Whisper accepts
-            ]
-
-            import os
-            import shutil
-            import tempfile
+# Low-confidence parses are only remembered briefly, so a user retyping a
+# message that seemed ignored doesn't trigger another GPT-4o call
+_RECENT_PARSE_TTL = 60.0
 
-            # Try with .ogg extension (should work with Whisper)
-            ogg_path = None
-            try:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".ogg") as temp_file:
-                    ogg_path = temp_file.name
-
-                # Copy the original file with .ogg extension
-                shutil.copy2(audio_file_path, ogg_path)
-
-                logger.info(f"Trying transcription with .ogg extension: {ogg_path}")
-
-                # Try transcribing as .ogg
-                with open(ogg_path, "rb") as audio_file:
-                    transcript = await self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language="es"
-                    )
-
-                transcribed_text = transcript.text
-                logger.info(f"Whisper transcription: '{transcribed_text}'")
-                return transcribed_text
-
-            except Exception as ogg_error:
-                logger.warning(f"OGG transcription failed: {ogg_error}")
-
-                # Try with .wav extension as fallback
-                wav_path = None
-                try:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-                        wav_path = temp_file.name
-
-                    shutil.copy2(audio_file_path, wav_path)
-
-                    logger.info(f"Trying transcription with .wav extension: {wav_path}")
-
-                    with open(wav_path, "rb") as audio_file:
-                        transcript = await self.client.audio.transcriptions.create(
-                            model="whisper-1",
-                            file=audio_file,
-                            language="es"
-                        )
-
-                    transcribed_text = transcript.text
-                    logger.info(f"Whisper transcription: '{transcribed_text}'")
-                    return transcribed_text
-
-                finally:
-                    if wav_path and os.path.exists(wav_path):
-                        try:
-                            os.unlink(wav_path)
-                        except Exception:
-                            pass
-
-            finally:
-                if ogg_path and os.path.exists(ogg_path):
-                    try:
-                        os.unlink(ogg_path)
-                    except Exception:
-                        pass
-
-        except Exception as e:
-            logger.error(f"Error transcribing audio: {e}")
-            return None
+# Reply body for generate_response_message, filled from balance_info
+_BALANCE_TPL = """
+Aquí tienes tu saldo actual, jefe 📊
 
-    async def process_ticket_image(self, image_file_path: str) -> Optional["ProcessedTransaction"]:
-        """Process ticket image to extract transaction information using GPT-4o Vision."""
-        try:
-            import base64
+💰 Saldo: ${current_balance:.2f} MXN
+📈 Ventas: ${total_sales:.2f}
+📉 Gastos: ${total_expenses:.2f}
+🔄 Ajustes: ${total_adjustments:.2f}
+"""
 
-            # Read and encode image
-            with open(image_file_path, "rb") as image_file:
-                image_data = image_file.read()
-                image_base64 = base64.b64encode(image_data).decode("utf-8")
+# Whisper upload extensions for the audio MIME types WhatsApp delivers
+_AUDIO_EXTENSIONS = {
+    "audio/ogg": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp4": "m4a",
+    "audio/webm": "webm",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+}
 
-            # Prompt for ticket analysis
-            system_prompt = """
+# Prompt for ticket analysis
+_TICKET_SYSTEM_PROMPT = """
 Eres un experto en leer tickets mexicanos para tenderos. Tu trabajo es extraer información y clasificar con alta precisión.
 
 REGLAS DE CLASIFICACIÓN:
@@ -146,68 +83,8 @@ IMPORTANTE:
 - Si dudas, asigna confianza 0.3-0.6
 """
 
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "Analiza este ticket de compra:"},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=300,
-            )
-
-            content = response.choices[0].message.content
-            logger.info(f"GPT-4o Vision response: {content}")
-
-            if not content or content.strip().lower() == "null":
-                return None
-
-            # Clean up and extract JSON
-            content = content.strip()
-            import re
-            json_match = re.search(r"\{.*\}", content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-            else:
-                json_str = content
-
-            import json
-            try:
-                data = json.loads(json_str)
-                # Return ProcessedTransaction directly
-                from decimal import Decimal
-
-                from .models import ProcessedTransaction, TransactionType
-
-                return ProcessedTransaction(
-                    transaction_type=TransactionType(data["transaction_type"]),
-                    amount=Decimal(str(data["amount"])),
-                    description=data["description"],
-                    confidence=float(data["confidence"]),
-                )
-            except (json.JSONDecodeError, KeyError, ValueError) as e:
-                logger.error(f"Error parsing Vision response: {e}")
-                return None
-
-        except Exception as e:
-            logger.error(f"Error processing ticket image: {e}")
-            return None
-
-    async def process_transaction_text(self, text: str) -> ProcessedTransaction | None:
-        """Process text to extract transaction information using GPT-4o."""
-        try:
-            system_prompt = """
+# Prompt for parsing a transaction from a text or transcribed message
+_TRANSACTION_SYSTEM_PROMPT = """
 Eres un asistente especializado en procesar mensajes de ventas de tienditas mexicanas.
 Tu trabajo es extraer información de transacciones de texto en español mexicano coloquial.
 
@@ -252,12 +129,211 @@ IMPORTANTE:
 - Si no puedes extraer información clara, responde con null
 """
 
+# The SDK only reads these, so one dict per prompt is shared by every call
+_TICKET_SYSTEM_MESSAGE = {"role": "system", "content": _TICKET_SYSTEM_PROMPT}
+_TRANSACTION_SYSTEM_MESSAGE = {"role": "system", "content": _TRANSACTION_SYSTEM_PROMPT}
+
+
+def _extract_json(content: str) -> str:
+    """Return the outermost {...} span of a model reply, or the reply itself."""
+    # Same span a greedy r"\{.*\}" match finds, via two C-level scans
+    start = content.find("{")
+    end = content.rfind("}")
+    return content[start : end + 1] if 0 <= start < end else content
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> AsyncOpenAI:
+    """Get the process-wide OpenAI client."""
+    settings = get_settings()
+    # One HTTP/2 keep-alive pool for every Whisper and GPT-4o call; the SDK
+    # retries 429/5xx itself with jittered exponential backoff
+    http_client = DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    )
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key, max_retries=4, http_client=http_client
+    )
+
+
+def _normalize_text(text: str) -> str:
+    """Normalize a message so trivial case/spacing changes share a cache key."""
+    return " ".join(text.lower().split())
+
+
+class OpenAIClient:
+    """OpenAI client for audio transcription and text processing."""
+
+    def __init__(self) -> None:
+        """Initialize OpenAI client."""
+        settings = get_settings()
+        self.client = get_openai_client()
+        # Cap in-flight requests so a burst of webhook messages queues here
+        # instead of piling multi-second calls onto the event loop
+        self._semaphore = asyncio.Semaphore(settings.openai_max_concurrency)
+        self._minimum_balance_alert = Decimal(str(settings.minimum_balance_alert))
+        self._parse_cache: TTLCache[tuple[str, str], ProcessedTransaction] = TTLCache(
+            ttl=_PARSE_CACHE_TTL, maxsize=10_000
+        )
+        self._recent_parses: TTLCache[str, tuple[str, ProcessedTransaction]] = (
+            TTLCache(ttl=_RECENT_PARSE_TTL, maxsize=10_000)
+        )
+
+    async def aclose(self) -> None:
+        """Close the SDK's pooled HTTP client."""
+        await self.client.close()
+        get_openai_client.cache_clear()
+
+    async def _create_transcription(self, **kwargs):
+        """Call the Whisper API within the concurrency limit."""
+        async with self._semaphore:
+            return await self.client.audio.transcriptions.create(**kwargs)
+
+    async def _create_chat_completion(self, **kwargs):
+        """Call the chat completions API within the concurrency limit."""
+        async with self._semaphore:
+            return await self.client.chat.completions.create(**kwargs)
+
+    async def transcribe_audio(
+        self, audio: bytes, mime_type: str = "audio/ogg"
+    ) -> str | None:
+        """Transcribe audio bytes to text using Whisper."""
+        try:
+            # Whisper picks the decoder from the file name, so name the upload
+            # after the MIME type Meta reported and only fall back to .wav
+            extension = _AUDIO_EXTENSIONS.get(mime_type.split(";")[0].strip(), "ogg")
+            try:
+                logger.info(f"Trying transcription with .{extension} extension")
+                transcript = await self._create_transcription(
+                    model="whisper-1",
+                    file=(f"audio.{extension}", audio),
+                    language="es"
+                )
+
+            except Exception as first_error:
+                if extension == "wav":
+                    raise
+                logger.warning(f"{extension.upper()} transcription failed: {first_error}")
+
+                logger.info("Trying transcription with .wav extension")
+                transcript = await self._create_transcription(
+                    model="whisper-1",
+                    file=("audio.wav", audio),
+                    language="es"
+                )
+
+            transcribed_text = transcript.text
+            logger.debug("Whisper transcription: '%s'", transcribed_text)
+            return transcribed_text
+
+        except Exception as e:
+            logger.error(f"Error transcribing audio: {e}")
+            return None
+
+    async def process_ticket_image(
+        self, image: bytes, mime_type: str = "image/jpeg"
+    ) -> Optional["ProcessedTransaction"]:
+        """Process ticket image to extract transaction information using GPT-4o Vision."""
+        try:
+            # Encode image
+            image_base64 = base64.b64encode(image).decode("utf-8")
+            if not mime_type.startswith("image/"):
+                mime_type = "image/jpeg"
+
+            response = await self._create_chat_completion(
+                model="gpt-4o",
+                messages=[
+                    _TICKET_SYSTEM_MESSAGE,
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": "Analiza este ticket de compra:"},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:{mime_type};base64,{image_base64}"
+                                }
+                            }
+                        ]
+                    }
+                ],
+                temperature=0.1,
+                max_tokens=300,
+            )
+
+            content = response.choices[0].message.content
+            logger.debug("GPT-4o Vision response: %s", content)
+
+            if not content or content.strip().lower() == "null":
+                return None
+
+            # Clean up and extract JSON
+            content = content.strip()
+            json_str = _extract_json(content)
+
+            try:
+                data = json.loads(json_str, parse_float=Decimal)
+                # Return ProcessedTransaction directly
+                return ProcessedTransaction(
+                    transaction_type=TransactionType(data["transaction_type"]),
+                    amount=Decimal(data["amount"]),
+                    description=data["description"],
+                    confidence=float(data["confidence"]),
+                )
+            except (json.JSONDecodeError, KeyError, ValueError) as e:
+                logger.error(f"Error parsing Vision response: {e}")
+                return None
+
+        except Exception as e:
+            logger.error(f"Error processing ticket image: {e}")
+            return None
+
+    async def process_transaction_text(
+        self, text: str, phone_number: str | None = None
+    ) -> ProcessedTransaction | None:
+        """Process text to extract transaction information using GPT-4o.
+
+        When phone_number is given, confident parses are cached per user and
+        the last low-confidence parse is reused for a minute.
+        """
+        if not phone_number:
+            return await self._parse_transaction_text(text)
+
+        normalized = _normalize_text(text)
+        cached = self._parse_cache.get((phone_number, normalized))
+        if cached is not None:
+            logger.info(f"Reusing cached parse for {phone_number}")
+            return cached
+
+        recent = self._recent_parses.get(phone_number)
+        if recent is not None and recent[0] == normalized:
+            logger.info(f"Reusing recent low-confidence parse for {phone_number}")
+            return recent[1]
+
+        processed = await self._parse_transaction_text(text)
+
+        if processed is not None:
+            if processed.confidence >= _CACHEABLE_CONFIDENCE:
+                self._parse_cache.set((phone_number, normalized), processed)
+            else:
+                self._recent_parses.set(phone_number, (normalized, processed))
+
+        return processed
+
+    def forget_recent_parse(self, phone_number: str) -> None:
+        """Drop the remembered low-confidence parse once it has been saved."""
+        self._recent_parses.pop(phone_number)
+
+    async def _parse_transaction_text(self, text: str) -> ProcessedTransaction | None:
+        """Ask GPT-4o to parse a transaction message."""
+        try:
             user_prompt = f"Procesa este mensaje: '{text}'"
 
-            response = await self.client.chat.completions.create(
+            response = await self._create_chat_completion(
                 model="gpt-4o",
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    _TRANSACTION_SYSTEM_MESSAGE,
                     {"role": "user", "content": user_prompt},
                 ],
                 temperature=0.1,
@@ -265,7 +341,7 @@ IMPORTANTE:
             )
 
             content = response.choices[0].message.content
-            logger.info(f"GPT-4o response: {content}")  # Debug: see what GPT returns
+            logger.debug("GPT-4o response: %s", content)
 
             if not content or content.strip().lower() == "null":
                 return None
@@ -273,22 +349,14 @@ IMPORTANTE:
             # Clean up the response - sometimes GPT adds markdown or extra text
             content = content.strip()
 
-            # Try to extract JSON from the response
-            import json
-            import re
-
             # Look for JSON block in the response
-            json_match = re.search(r"\{.*\}", content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-            else:
-                json_str = content
+            json_str = _extract_json(content)
 
             try:
-                data = json.loads(json_str)
+                data = json.loads(json_str, parse_float=Decimal)
                 return ProcessedTransaction(
                     transaction_type=TransactionType(data["transaction_type"]),
-                    amount=Decimal(str(data["amount"])),
+                    amount=Decimal(data["amount"]),
                     description=data["description"],
                     confidence=float(data["confidence"]),
                 )
@@ -302,29 +370,12 @@ IMPORTANTE:
             logger.error(f"Error processing transaction text: {e}")
             return None
 
-    async def generate_response_message(
-        self, balance_info: dict, transaction_added: bool = True
-    ) -> str:
+    async def generate_response_message(self, balance_info: dict) -> str:
         """Generate a response message in Mexican Spanish."""
         try:
-            if transaction_added:
-                base_message = f"""
-¡Órale! Tu transacción ya quedó registrada 🎯
-
-💰 Saldo actual: ${balance_info['current_balance']:.2f} MXN
-📈 Total ventas: ${balance_info['total_sales']:.2f}
-📉 Total gastos: ${balance_info['total_expenses']:.2f}
-🔄 Total ajustes: ${balance_info.get('total_adjustments', 0):.2f}
-"""
-            else:
-                base_message = f"""
-Aquí tienes tu saldo actual, jefe 📊
-
-💰 Saldo: ${balance_info['current_balance']:.2f} MXN
-📈 Ventas: ${balance_info['total_sales']:.2f}
-📉 Gastos: ${balance_info['total_expenses']:.2f}
-🔄 Ajustes: ${balance_info.get('total_adjustments', 0):.2f}
-"""
+            base_message = _BALANCE_TPL.format_map(
+                {"total_adjustments": 0, **balance_info}
+            )
 
             # Add cash flow estimation
             days_remaining = balance_info.get('days_remaining')
@@ -343,9 +394,8 @@ Aquí tienes tu saldo actual, jefe 📊
                 base_message += f"\n\n{tip}"
 
             # Add low balance warning if needed
-            settings = get_settings()
-            if balance_info["current_balance"] < settings.minimum_balance_alert:
-                base_message += f"\n⚠️ ¡Ojo! Tu saldo está bajito (menos de ${settings.minimum_balance_alert:.2f})"
+            if balance_info["current_balance"] < self._minimum_balance_alert:
+                base_message += f"\n⚠️ ¡Ojo! Tu saldo está bajito (menos de ${self._minimum_balance_alert:.2f})"
 
             return base_message.strip()
 
@@ -411,7 +461,6 @@ Aquí tienes tu saldo actual, jefe 📊
                 ])
             
             # Return a random tip
-            import random
             return random.choice(tips) if tips else ""
             
         except Exception as e:
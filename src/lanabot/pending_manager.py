@@ -3,35 +3,49 @@
 import logging
 from datetime import UTC, datetime, timedelta
 
+from .cache import TTLCache
 from .models import PendingTransaction, ProcessedTransaction
 
 
 logger = logging.getLogger(__name__)
 
+# How long a suggestion waits for the user to confirm it
+_PENDING_TTL = 2 * 60
+
+# How long a handled message ID is remembered to drop Meta redeliveries;
+# older redeliveries still hit the (phone_number, message_id) unique index
+_SEEN_MESSAGE_TTL = 24 * 60 * 60
+
 
 class PendingTransactionManager:
     """Manages pending transactions in memory."""
 
     def __init__(self):
         """Initialize the pending transaction manager."""
-        self._pending: dict[str, PendingTransaction] = {}
+        self._pending: TTLCache[str, PendingTransaction] = TTLCache(
+            ttl=_PENDING_TTL, maxsize=10_000
+        )
+        self._seen_messages: TTLCache[str, bool] = TTLCache(
+            ttl=_SEEN_MESSAGE_TTL, maxsize=100_000
+        )
 
     def add_pending(self, phone_number: str, processed_transaction: ProcessedTransaction, transaction_id: int = None) -> None:
         """Add a pending transaction for confirmation."""
-        expires_at = datetime.now(UTC) + timedelta(minutes=2)  # 2 minute timeout
+        now = datetime.now(UTC)
+        expires_at = now + timedelta(seconds=_PENDING_TTL)
 
         pending = PendingTransaction(
             phone_number=phone_number,
             transaction_type=processed_transaction.transaction_type,
             amount=processed_transaction.amount,
             description=processed_transaction.description,
-            suggested_at=datetime.now(UTC),
+            suggested_at=now,
             expires_at=expires_at,
             transaction_id=transaction_id
         )
 
-        self._pending[phone_number] = pending
-        logger.info(f"Added pending transaction for {phone_number}: {pending}")
+        self._pending.set(phone_number, pending)
+        logger.debug("Added pending transaction for %s: %s", phone_number, pending)
 
     def get_pending(self, phone_number: str) -> PendingTransaction | None:
         """Get pending transaction for a phone number."""
@@ -39,7 +53,7 @@ class PendingTransactionManager:
 
         if pending and datetime.now(UTC) > pending.expires_at:
             # Transaction expired, remove it
-            del self._pending[phone_number]
+            self._pending.pop(phone_number)
             logger.info(f"Expired pending transaction for {phone_number}")
             return None
 
@@ -47,23 +61,35 @@ class PendingTransactionManager:
 
     def remove_pending(self, phone_number: str) -> PendingTransaction | None:
         """Remove and return pending transaction."""
-        return self._pending.pop(phone_number, None)
+        return self._pending.pop(phone_number)
+
+    def pop_pending(self, phone_number: str) -> PendingTransaction | None:
+        """Remove and return an unexpired pending transaction in one lookup."""
+        pending = self._pending.pop(phone_number)
+
+        if pending and datetime.now(UTC) > pending.expires_at:
+            logger.info(f"Expired pending transaction for {phone_number}")
+            return None
+
+        return pending
 
     def has_pending(self, phone_number: str) -> bool:
         """Check if user has a pending transaction."""
         return self.get_pending(phone_number) is not None
 
+    def mark_message_seen(self, message_id: str) -> bool:
+        """Record a message ID; return False if it was already seen."""
+        if message_id in self._seen_messages:
+            return False
+
+        self._seen_messages.set(message_id, True)
+        return True
+
     def cleanup_expired(self) -> None:
         """Remove all expired pending transactions."""
-        now = datetime.now(UTC)
-        expired_phones = [
-            phone for phone, pending in self._pending.items()
-            if now > pending.expires_at
-        ]
-
-        for phone in expired_phones:
-            del self._pending[phone]
-            logger.info(f"Cleaned up expired pending transaction for {phone}")
+        expired = self._pending.expire()
+        if expired:
+            logger.info(f"Cleaned up {expired} expired pending transactions")
 
 
 # Global instance
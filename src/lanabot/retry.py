@@ -0,0 +1,58 @@
+"""Retry helper with exponential backoff for LanaBot."""
+
+import asyncio
+import logging
+import random
+from collections.abc import Awaitable, Callable
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+# Rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Statuses where the server refused the request outright, so resending a
+# non-idempotent POST can't duplicate it
+RESENDABLE_STATUS_CODES = frozenset({429, 503})
+
+
+def is_retryable_http_error(error: Exception) -> bool:
+    """Check if an httpx error is transient and worth retrying."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def is_resendable_http_error(error: Exception) -> bool:
+    """Check if a failed non-idempotent request certainly had no effect."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RESENDABLE_STATUS_CODES
+    return isinstance(error, httpx.ConnectError | httpx.ConnectTimeout)
+
+
+async def retry_with_backoff[T](
+    coro_factory: Callable[[], Awaitable[T]],
+    should_retry: Callable[[Exception], bool],
+    retries: int = 4,
+    base: float = 0.2,
+    max_delay: float = 2.0,
+) -> T:
+    """Await coro_factory(), retrying with jittered exponential backoff.
+
+    Only errors accepted by should_retry are retried; the last one is re-raised.
+    """
+    for attempt in range(retries - 1):
+        try:
+            return await coro_factory()
+        except Exception as e:
+            if not should_retry(e):
+                raise
+            delay = min(max_delay, base * 2**attempt) + random.random() * 0.1
+            logger.warning(
+                f"Attempt {attempt + 1} failed, retrying in {delay:.2f}s: {e}"
+            )
+            await asyncio.sleep(delay)
+
+    return await coro_factory()
@@ -3,12 +3,18 @@
 import hashlib
 import hmac
 import logging
-import tempfile
-from datetime import datetime, timedelta
+from datetime import UTC, datetime, timedelta
 
 import httpx
 
 from .config import get_settings
+from .retry import (
+    RESENDABLE_STATUS_CODES,
+    RETRYABLE_STATUS_CODES,
+    is_resendable_http_error,
+    is_retryable_http_error,
+    retry_with_backoff,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -17,9 +23,15 @@ logger = logging.getLogger(__name__)
 class WhatsAppClient:
     """WhatsApp Business Cloud API client for Meta."""
 
-    def __init__(self) -> None:
+    def __init__(self, http_client: httpx.AsyncClient | None = None) -> None:
         """Initialize Meta WhatsApp client."""
         self.settings = get_settings()
+        # One pooled HTTP/2 client so replies reuse the TLS connection to Meta
+        self._http = http_client or httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=10.0,
+        )
         self.base_url = "https://graph.facebook.com/v18.0"
         self._access_token = self.settings.meta_access_token
         self._token_expires_at = None
@@ -28,6 +40,10 @@ class WhatsAppClient:
             "Content-Type": "application/json"
         }
 
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client."""
+        await self._http.aclose()
+
     def normalize_mexican_phone_number(self, phone_number: str) -> str:
         """Normalize Mexican phone numbers for WhatsApp Business API."""
         # Remove any non-digit characters
@@ -70,8 +86,7 @@ class WhatsAppClient:
                 "client_secret": self.settings.meta_app_secret
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params)
+            response = await self._http.get(url, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -82,13 +97,12 @@ class WhatsAppClient:
                     test_url = f"{self.base_url}/{self.settings.meta_phone_number_id}"
                     test_headers = {"Authorization": f"Bearer {new_token}"}
                     
-                    async with httpx.AsyncClient() as client:
-                        test_response = await client.get(test_url, headers=test_headers)
+                    test_response = await self._http.get(test_url, headers=test_headers)
                     
                     if test_response.status_code == 200:
                         # Token works! Update it
                         self._access_token = new_token
-                        self._token_expires_at = datetime.utcnow() + timedelta(days=30)
+                        self._token_expires_at = datetime.now(UTC) + timedelta(days=30)
                         self.headers["Authorization"] = f"Bearer {self._access_token}"
                         logger.info("✅ Successfully refreshed Meta access token (app token works!)")
                         return True
@@ -115,11 +129,11 @@ class WhatsAppClient:
             if self._token_expires_at is None:
                 logger.info("No token expiration time set, proceeding with current token")
                 # Set a far future date to avoid repeated refresh attempts
-                self._token_expires_at = datetime.utcnow() + timedelta(days=30)
+                self._token_expires_at = datetime.now(UTC) + timedelta(days=30)
                 return True
             
             # If token is about to expire (within 1 hour), try to refresh it
-            if datetime.utcnow() + timedelta(hours=1) >= self._token_expires_at:
+            if datetime.now(UTC) + timedelta(hours=1) >= self._token_expires_at:
                 logger.info("Token expiring soon, attempting refresh")
                 success = await self._refresh_access_token()
                 if not success:
@@ -135,6 +149,30 @@ class WhatsAppClient:
             logger.error(f"Error checking token validity: {e}")
             return True  # Continue anyway, handle errors at API level
 
+    async def _post(self, url: str, payload: dict) -> httpx.Response:
+        """POST to the Graph API, retrying only failures that sent nothing."""
+
+        # After a 5xx or a read timeout Meta may already have delivered the
+        # message, so only rate limits and connect failures are resent
+        async def post() -> httpx.Response:
+            response = await self._http.post(url, headers=self.headers, json=payload)
+            if response.status_code in RESENDABLE_STATUS_CODES:
+                response.raise_for_status()
+            return response
+
+        return await retry_with_backoff(post, should_retry=is_resendable_http_error)
+
+    async def _get(self, url: str) -> httpx.Response:
+        """GET from the Graph API, retrying rate limits and transient failures."""
+
+        async def get() -> httpx.Response:
+            response = await self._http.get(url, headers=self.headers)
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                response.raise_for_status()
+            return response
+
+        return await retry_with_backoff(get, should_retry=is_retryable_http_error)
+
     async def send_message(self, to: str, message: str) -> bool:
         """Send a text message via WhatsApp using Meta Cloud API."""
         try:
@@ -144,7 +182,7 @@ class WhatsAppClient:
                 return False
 
             # Remove whatsapp: prefix if present and normalize format
-            phone_number = to.replace("whatsapp:", "").replace("+", "")
+            phone_number = to.removeprefix("whatsapp:").removeprefix("+")
             phone_number = self.normalize_mexican_phone_number(phone_number)
 
             url = f"{self.base_url}/{self.settings.meta_phone_number_id}/messages"
@@ -158,8 +196,7 @@ class WhatsAppClient:
                 }
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=payload)
+            response = await self._post(url, payload)
 
             if response.status_code == 200:
                 result = response.json()
@@ -171,8 +208,7 @@ class WhatsAppClient:
                 logger.warning("Received 401, attempting token refresh and retry")
                 if await self._refresh_access_token():
                     # Retry the request with new token
-                    async with httpx.AsyncClient() as client:
-                        response = await client.post(url, headers=self.headers, json=payload)
+                    response = await self._post(url, payload)
                     
                     if response.status_code == 200:
                         result = response.json()
@@ -208,7 +244,7 @@ class WhatsAppClient:
                 return False
 
             # Remove whatsapp: prefix if present and normalize format
-            phone_number = to.replace("whatsapp:", "").replace("+", "")
+            phone_number = to.removeprefix("whatsapp:").removeprefix("+")
             phone_number = self.normalize_mexican_phone_number(phone_number)
 
             url = f"{self.base_url}/{self.settings.meta_phone_number_id}/messages"
@@ -227,8 +263,7 @@ class WhatsAppClient:
                 }
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=payload)
+            response = await self._post(url, payload)
 
             if response.status_code == 200:
                 result = response.json()
@@ -250,7 +285,7 @@ class WhatsAppClient:
         """Send transaction confirmation using custom template."""
         try:
             # Remove whatsapp: prefix if present and normalize format
-            phone_number = to.replace("whatsapp:", "").replace("+", "")
+            phone_number = to.removeprefix("whatsapp:").removeprefix("+")
             phone_number = self.normalize_mexican_phone_number(phone_number)
 
             url = f"{self.base_url}/{self.settings.meta_phone_number_id}/messages"
@@ -284,8 +319,7 @@ class WhatsAppClient:
                 }
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=payload)
+            response = await self._post(url, payload)
 
             if response.status_code == 200:
                 result = response.json()
@@ -311,7 +345,7 @@ class WhatsAppClient:
             ).hexdigest()
 
             # Meta sends signature as 'sha256=<signature>'
-            signature_without_prefix = signature.replace("sha256=", "")
+            signature_without_prefix = signature.removeprefix("sha256=")
 
             return hmac.compare_digest(expected_signature, signature_without_prefix)
 
@@ -319,8 +353,8 @@ class WhatsAppClient:
             logger.error(f"Error verifying webhook signature: {e}")
             return False
 
-    async def download_media(self, media_id: str) -> str | None:
-        """Download media file from Meta and return local path."""
+    async def download_media(self, media_id: str) -> tuple[bytes, str] | None:
+        """Download media from Meta and return its bytes and MIME type."""
         try:
             # Ensure we have a valid token
             if not await self._ensure_valid_token():
@@ -332,54 +366,25 @@ class WhatsAppClient:
             # Get media info first
             media_info_url = f"{self.base_url}/{media_id}"
 
-            async with httpx.AsyncClient() as client:
-                # Get media info first
-                info_response = await client.get(media_info_url, headers=self.headers)
+            info_response = await self._get(media_info_url)
 
-                if info_response.status_code != 200:
-                    logger.error(f"Failed to get media info: {info_response.status_code}")
-                    return None
+            if info_response.status_code != 200:
+                logger.error(f"Failed to get media info: {info_response.status_code}")
+                return None
 
-                media_info = info_response.json()
-                actual_media_url = media_info.get("url")
+            media_info = info_response.json()
+            actual_media_url = media_info.get("url")
 
-                if not actual_media_url:
-                    logger.error("No media URL found in response")
-                    return None
+            if not actual_media_url:
+                logger.error("No media URL found in response")
+                return None
 
-                # Download the actual media file
-                media_response = await client.get(actual_media_url, headers=self.headers)
+            # Download the actual media file
+            media_response = await self._get(actual_media_url)
 
             if media_response.status_code == 200:
-                # Determine file extension from mime type
-                mime_type = media_info.get("mime_type", "")
-
-                if "audio" in mime_type:
-                    if "ogg" in mime_type:
-                        extension = ".ogg"
-                    elif "mpeg" in mime_type or "mp3" in mime_type:
-                        extension = ".mp3"
-                    elif "wav" in mime_type:
-                        extension = ".wav"
-                    else:
-                        extension = ".ogg"  # Default for WhatsApp audio
-                elif "image" in mime_type:
-                    if "jpeg" in mime_type:
-                        extension = ".jpg"
-                    elif "png" in mime_type:
-                        extension = ".png"
-                    else:
-                        extension = ".jpg"  # Default
-                else:
-                    extension = ".tmp"
-
-                # Create temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as tmp_file:
-                    tmp_file.write(media_response.content)
-                    file_path = tmp_file.name
-
                 logger.info(f"Downloaded media successfully: {len(media_response.content)} bytes")
-                return file_path
+                return media_response.content, media_info.get("mime_type", "")
             else:
                 logger.error(f"Failed to download media: {media_response.status_code}")
                 return None
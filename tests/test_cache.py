@@ -0,0 +1,68 @@
+"""Tests for the in-process TTL cache."""
+
+from src.lanabot import cache
+from src.lanabot.cache import TTLCache
+
+
+def test_get_and_set():
+    """Test storing and reading a value."""
+    ttl_cache = TTLCache(ttl=60)
+    ttl_cache.set("5215512345678", 100)
+
+    assert ttl_cache.get("5215512345678") == 100
+    assert "5215512345678" in ttl_cache
+    assert ttl_cache.get("missing") is None
+
+
+def test_entries_expire(monkeypatch):
+    """Test that entries are dropped once their TTL has passed."""
+    now = 1000.0
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now)
+
+    ttl_cache = TTLCache(ttl=5)
+    ttl_cache.set("key", "value")
+
+    now = 1004.9
+    assert ttl_cache.get("key") == "value"
+
+    now = 1005.0
+    assert ttl_cache.get("key") is None
+    assert len(ttl_cache) == 0
+
+
+def test_evicts_least_recently_used():
+    """Test that the oldest unused entry is evicted when full."""
+    ttl_cache = TTLCache(ttl=60, maxsize=2)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("c") == 3
+
+
+def test_pop():
+    """Test removing an entry."""
+    ttl_cache = TTLCache(ttl=60)
+    ttl_cache.set("key", "value")
+
+    assert ttl_cache.pop("key") == "value"
+    assert ttl_cache.pop("key") is None
+
+
+def test_expire_drops_stale_entries(monkeypatch):
+    """Test that expire() removes only entries past their TTL."""
+    now = 1000.0
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now)
+
+    ttl_cache = TTLCache(ttl=5)
+    ttl_cache.set("old", 1)
+    now = 1003.0
+    ttl_cache.set("new", 2)
+
+    now = 1006.0
+    assert ttl_cache.expire() == 1
+    assert len(ttl_cache) == 1
+    assert ttl_cache.get("new") == 2
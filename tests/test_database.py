@@ -0,0 +1,78 @@
+"""Tests for DatabaseManager transaction inserts."""
+
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from postgrest.exceptions import APIError
+
+from src.lanabot.cache import TTLCache
+from src.lanabot.database import DatabaseManager
+from src.lanabot.models import Transaction, TransactionType
+
+
+ROW = {"id": 7, "created_at": "2024-01-01T00:00:00+00:00", "updated_at": None}
+
+
+class FakeTable:
+    """Records the write issued against the transactions table."""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def upsert(self, data, **kwargs):
+        self.calls.append(("upsert", data, kwargs))
+        return self
+
+    def insert(self, data):
+        self.calls.append(("insert", data, {}))
+        return self
+
+    def execute(self):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return SimpleNamespace(data=result)
+
+
+def _manager(table: FakeTable) -> DatabaseManager:
+    """Build a DatabaseManager around a fake Supabase client."""
+    manager = DatabaseManager.__new__(DatabaseManager)
+    manager.client = SimpleNamespace(table=lambda _name: table)
+    manager._balance_cache = TTLCache(ttl=5)
+    manager._snapshot_cache = TTLCache(ttl=5)
+    return manager
+
+
+def _transaction() -> Transaction:
+    """Build a transaction that came from a WhatsApp message."""
+    return Transaction(
+        phone_number="5215512345678",
+        transaction_type=TransactionType.VENTA,
+        amount=Decimal("45"),
+        description="3 refrescos",
+        message_id="wamid.1",
+    )
+
+
+@pytest.mark.asyncio
+async def test_redelivered_message_is_not_overwritten():
+    """Test that a message already recorded is skipped, not upserted over."""
+    table = FakeTable([[]])
+
+    assert await _manager(table).create_transaction(_transaction()) is None
+    assert table.calls[0][2]["ignore_duplicates"] is True
+
+
+@pytest.mark.asyncio
+async def test_insert_falls_back_without_message_id_migration():
+    """Test that a database without the message_id column still records rows."""
+    missing_column = APIError({"code": "PGRST204", "message": "no message_id"})
+    table = FakeTable([missing_column, [ROW]])
+
+    saved = await _manager(table).create_transaction(_transaction())
+
+    assert saved.id == 7
+    assert table.calls[1][0] == "insert"
+    assert "message_id" not in table.calls[1][1]
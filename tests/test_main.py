@@ -1,9 +1,21 @@
 """Tests for main FastAPI application."""
 
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
 
-from src.lanabot.main import app
+from src.lanabot.main import (
+    _background_tasks,
+    _sender_locks,
+    app,
+    drain_background_tasks,
+    is_balance_inquiry,
+    is_search_inquiry,
+    is_welcome_inquiry,
+    run_in_background,
+    sender_lock,
+)
 
 
 @pytest.fixture
@@ -75,4 +87,99 @@ def test_webhook_post_endpoint(client):
     
     # This will likely fail due to missing API keys, but tests the endpoint structure
     response = client.post("/webhook", json=payload)
-    assert response.status_code in [200, 500]
\ No newline at end of file
+    assert response.status_code in [200, 500]
+
+
+def test_webhook_post_rejects_non_json(client):
+    """Test webhook POST rejects form-encoded probes before parsing."""
+    response = client.post("/webhook", data={"MessageSid": "probe"})
+    assert response.status_code == 415
+
+
+def test_webhook_post_rejects_bad_or_oversized_bodies(client):
+    """Test webhook POST validates Content-Length and caps chunked bodies."""
+    headers = {"content-type": "application/json", "content-length": "abc"}
+    response = client.post("/webhook", content=b"{}", headers=headers)
+    assert response.status_code == 400
+
+    def chunks():
+        for _ in range(300):
+            yield b" " * 1024
+
+    response = client.post(
+        "/webhook", content=chunks(), headers={"content-type": "application/json"}
+    )
+    assert response.status_code == 413
+
+
+def test_is_search_inquiry():
+    """Test search phrase detection and term extraction on normalized text."""
+    assert is_search_inquiry("¿cuánto gasté en coca hoy?") == (True, "coca", "gasto")
+    assert is_search_inquiry("ventas de dulces") == (True, "dulces", "venta")
+    assert is_search_inquiry("cuánto gasté en playeras") == (True, "playeras", "gasto")
+    assert is_search_inquiry("gastos de?") == (False, "", "")
+    assert is_search_inquiry("vendí 3 cocas") == (False, "", "")
+    # Expense phrases are checked first, as before the regex rewrite
+    assert is_search_inquiry("ventas de cuánto gasté en coca") == (
+        True,
+        "coca",
+        "gasto",
+    )
+
+
+def test_keyword_inquiries():
+    """Test welcome and balance keyword detection on normalized text."""
+    assert is_welcome_inquiry("buenas tardes")
+    assert is_welcome_inquiry("hola!")
+    assert not is_welcome_inquiry("vendí 3 cocas")
+    assert not is_welcome_inquiry("vendí 2 bolsas de chicharrones")
+    assert is_balance_inquiry("¿cuánto tengo?")
+    assert not is_balance_inquiry("compré 2 kilos de azúcar")
+
+
+@pytest.mark.asyncio
+async def test_sender_lock_serializes_per_sender():
+    """Test that messages from one sender run in order and the lock is freed."""
+    order = []
+
+    async def handle(phone_number, label):
+        async with sender_lock(phone_number):
+            order.append(f"{label}-start")
+            await asyncio.sleep(0)
+            order.append(f"{label}-end")
+
+    await asyncio.gather(handle("521", "a"), handle("521", "b"))
+
+    assert order == ["a-start", "a-end", "b-start", "b-end"]
+    assert "521" not in _sender_locks
+
+
+@pytest.mark.asyncio
+async def test_drain_background_tasks_waits_for_messages():
+    """Test that shutdown lets a message in progress finish."""
+    done = []
+
+    async def process():
+        await asyncio.sleep(0.01)
+        done.append(True)
+
+    run_in_background(process())
+    await drain_background_tasks(timeout=1)
+
+    assert done == [True]
+
+
+@pytest.mark.asyncio
+async def test_drain_background_tasks_cancels_stragglers():
+    """Test that tasks still running after the timeout are cancelled."""
+    task_started = asyncio.Event()
+
+    async def process():
+        task_started.set()
+        await asyncio.sleep(10)
+
+    run_in_background(process())
+    await task_started.wait()
+    await drain_background_tasks(timeout=0.01)
+
+    assert not _background_tasks
@@ -7,6 +7,7 @@ import pytest
 from pydantic import ValidationError
 
 from src.lanabot.models import (
+    AccountSnapshot,
     Balance,
     ProcessedTransaction,
     Transaction,
@@ -82,6 +83,27 @@ def test_balance_model():
     assert balance.total_expenses == Decimal("500.00")
 
 
+def test_account_snapshot_days_remaining():
+    """Test AccountSnapshot cash-flow estimate."""
+    balance = Balance(
+        phone_number="1234567890",
+        current_balance=Decimal("1000.00"),
+        last_updated=datetime.now(),
+    )
+
+    snapshot = AccountSnapshot(
+        balance=balance, daily_expense_average=Decimal("400"), low_balance=False
+    )
+    assert snapshot.days_remaining == 2.5
+
+    empty = AccountSnapshot(
+        balance=balance.model_copy(update={"current_balance": Decimal("0")}),
+        daily_expense_average=Decimal("400"),
+        low_balance=True,
+    )
+    assert empty.days_remaining is None
+
+
 def test_whatsapp_message_model():
     """Test WhatsAppMessage model."""
     message = WhatsAppMessage(
@@ -89,11 +111,12 @@ def test_whatsapp_message_model():
         from_number="1234567890",
         message_type="text",
         content="Vendí 5 refrescos",
-        timestamp=datetime.now(),
+        timestamp=1234567890,
     )
     
     assert message.message_id == "msg123"
     assert message.from_number == "1234567890"
     assert message.message_type == "text"
     assert message.content == "Vendí 5 refrescos"
-    assert message.audio_url is None
\ No newline at end of file
+    assert message.audio_url is None
+    assert message.timestamp == 1234567890
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""Tests for the retry helper."""
+
+import httpx
+import pytest
+
+from src.lanabot import retry
+from src.lanabot.retry import (
+    is_resendable_http_error,
+    is_retryable_http_error,
+    retry_with_backoff,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Skip real backoff delays."""
+
+    async def sleep(_delay):
+        return None
+
+    monkeypatch.setattr(retry.asyncio, "sleep", sleep)
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    """Build an HTTPStatusError for the given status."""
+    request = httpx.Request("POST", "https://graph.facebook.com/v18.0/messages")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+@pytest.mark.asyncio
+async def test_retries_until_success():
+    """Test that retryable errors are retried until the call succeeds."""
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise _status_error(503)
+        return "ok"
+
+    assert await retry_with_backoff(flaky, should_retry=is_retryable_http_error) == "ok"
+    assert calls == 3
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_retries():
+    """Test that the last error is raised once attempts run out."""
+    calls = 0
+
+    async def always_limited():
+        nonlocal calls
+        calls += 1
+        raise _status_error(429)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await retry_with_backoff(
+            always_limited, should_retry=is_retryable_http_error, retries=3
+        )
+    assert calls == 3
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_client_errors():
+    """Test that non-transient errors are raised immediately."""
+    calls = 0
+
+    async def bad_request():
+        nonlocal calls
+        calls += 1
+        raise _status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await retry_with_backoff(bad_request, should_retry=is_retryable_http_error)
+    assert calls == 1
+
+
+def test_resendable_errors_exclude_ambiguous_failures():
+    """Test that POST resends skip errors where the request may have landed."""
+    request = httpx.Request("POST", "https://graph.facebook.com/v18.0/messages")
+
+    assert is_resendable_http_error(_status_error(429))
+    assert is_resendable_http_error(_status_error(503))
+    assert is_resendable_http_error(httpx.ConnectError("refused", request=request))
+    assert not is_resendable_http_error(_status_error(500))
+    assert not is_resendable_http_error(_status_error(504))
+    assert not is_resendable_http_error(httpx.ReadTimeout("slow", request=request))